@@ -0,0 +1,216 @@
+import argparse
+import csv
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import degrees
+from util import (Node, StackFrontier, QueueFrontier,
+                  IndexedStackFrontier, IndexedQueueFrontier)
+
+FRONTIERS = [
+    StackFrontier,
+    QueueFrontier,
+    IndexedStackFrontier,
+    IndexedQueueFrontier,
+]
+
+SEARCH_MODES = ["bfs", "bidirectional", "astar"]
+
+FIRST_NAMES = ["Alex", "Sam", "Jordan", "Taylor", "Morgan", "Casey",
+               "Jamie", "Riley", "Avery", "Quinn", "Drew", "Robin"]
+LAST_NAMES = ["Smith", "Jones", "Brown", "Garcia", "Miller", "Davis",
+              "Wilson", "Moore", "Clark", "Lewis", "Walker", "Young"]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks for the degrees search code.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    frontier = commands.add_parser(
+        "frontier", help="time the frontier classes")
+    frontier.add_argument("--size", type=int, default=20000,
+                          help="number of nodes pushed through each frontier")
+
+    generate = commands.add_parser(
+        "generate", help="write a synthetic dataset of CSV files")
+    generate.add_argument("directory")
+    add_dataset_arguments(generate)
+
+    search = commands.add_parser(
+        "search", help="time loading and searching a dataset")
+    search.add_argument("directory", nargs="?",
+                        help="dataset to load (default: a generated one)")
+    add_dataset_arguments(search)
+    search.add_argument("--queries", type=int, default=100,
+                        help="number of random source/target pairs")
+    search.add_argument("--landmarks", type=int, default=8,
+                        help="landmarks for the A* mode")
+    search.add_argument("--compact", action="store_true",
+                        help="load the data in compact mode")
+    search.add_argument("--json", metavar="FILE",
+                        help="also write the results to FILE as JSON")
+
+    args = parser.parse_args()
+    if args.command == "frontier":
+        print(f"Frontier benchmark (n = {args.size})")
+        for frontier_class in FRONTIERS:
+            elapsed = time_frontier(frontier_class, args.size)
+            print(f"  {frontier_class.__name__}: {elapsed:.4f}s")
+
+    elif args.command == "generate":
+        generate_dataset(args.directory, args.people, args.movies,
+                         args.cast, args.exponent, args.seed)
+
+    else:
+        if args.directory is not None:
+            results = benchmark_search(args.directory, args.queries,
+                                       args.landmarks, args.compact, args.seed)
+        else:
+            with tempfile.TemporaryDirectory() as directory:
+                generate_dataset(directory, args.people, args.movies,
+                                 args.cast, args.exponent, args.seed)
+                results = benchmark_search(directory, args.queries,
+                                           args.landmarks, args.compact, args.seed)
+        print_results(results)
+        if args.json is not None:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+
+
+def add_dataset_arguments(parser):
+    parser.add_argument("--people", type=int, default=20000)
+    parser.add_argument("--movies", type=int, default=5000)
+    parser.add_argument("--cast", type=int, default=6,
+                        help="average number of stars per movie")
+    parser.add_argument("--exponent", type=float, default=2.2,
+                        help="power-law exponent of movies per person")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def time_frontier(frontier_class, n):
+    """
+    Return the seconds taken to push `n` nodes through a frontier the way
+    breadth-first search does: a membership test before every add,
+    and removals interleaved with the adds.
+    """
+    frontier = frontier_class()
+    start = time.perf_counter()
+    for state in range(n):
+        if not frontier.contains_state(state):
+            frontier.add(Node(state=state, parent=None, action=None))
+        if state % 2 == 1:
+            frontier.remove()
+    while not frontier.empty():
+        frontier.remove()
+    return time.perf_counter() - start
+
+
+def generate_dataset(directory, num_people, num_movies, cast, exponent, seed):
+    """
+    Write people.csv, movies.csv and stars.csv to `directory` for a
+    random cast graph in which the number of movies per person follows
+    a power law with the given exponent, as in real casts where a few
+    prolific actors link most of the graph together.
+
+    The same arguments always produce the same files.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+
+    # Person i is picked with weight (i + 1) ** -(1 / (exponent - 1)),
+    # which gives a degree distribution with the requested exponent
+    weights = [(i + 1) ** (-1 / (exponent - 1)) for i in range(num_people)]
+    cumulative = []
+    total = 0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+
+    with open(os.path.join(directory, "people.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "birth"])
+        for person in range(num_people):
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {person % 997}"
+            writer.writerow([person + 1, name, rng.randint(1920, 2005)])
+
+    with open(os.path.join(directory, "movies.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "title", "year"])
+        for movie in range(num_movies):
+            writer.writerow([movie + 1, f"Movie {movie + 1}", rng.randint(1930, 2025)])
+
+    with open(os.path.join(directory, "stars.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["person_id", "movie_id"])
+        for movie in range(num_movies):
+            size = rng.randint(2, 2 * cast - 2) if cast > 2 else 2
+            stars = set(rng.choices(range(num_people), cum_weights=cumulative, k=size))
+            for person in sorted(stars):
+                writer.writerow([person + 1, movie + 1])
+
+
+def benchmark_search(directory, num_queries, num_landmarks, compact, seed):
+    """
+    Load the dataset in `directory` cold (from CSV) and warm (from the
+    snapshot), then answer the same random queries in every search mode.
+    Return the timings and instrumentation as a dictionary.
+    """
+    results = {"directory": directory, "queries": num_queries, "load": {}, "search": {}}
+    degrees.stats.enabled = True
+
+    degrees.load_data(directory, snapshot=False, compact=compact)
+    results["load"]["csv"] = degrees.stats.load_seconds
+    degrees.write_snapshot(directory)
+    degrees.load_data(directory)
+    results["load"]["snapshot"] = degrees.stats.load_seconds
+
+    rng = random.Random(seed)
+    person_ids = list(degrees.people)
+    queries = [(rng.choice(person_ids), rng.choice(person_ids))
+               for _ in range(num_queries)]
+
+    start = time.perf_counter()
+    degrees.use_landmarks(directory, num_landmarks)
+    results["load"]["landmarks"] = time.perf_counter() - start
+
+    for mode in SEARCH_MODES:
+        seconds, explored, peaks, expand = [], [], [], []
+        for source, target in queries:
+            start = time.perf_counter()
+            degrees.shortest_path(source, target,
+                                  bidirectional=mode == "bidirectional",
+                                  astar=mode == "astar")
+            seconds.append(time.perf_counter() - start)
+            explored.append(degrees.stats.nodes_explored)
+            peaks.append(degrees.stats.frontier_peak)
+            expand.append(degrees.stats.expand_seconds)
+        results["search"][mode] = {
+            "mean_seconds": statistics.mean(seconds),
+            "median_seconds": statistics.median(seconds),
+            "mean_explored": statistics.mean(explored),
+            "mean_frontier_peak": statistics.mean(peaks),
+            "mean_expand_seconds": statistics.mean(expand),
+        }
+
+    return results
+
+
+def print_results(results):
+    load = results["load"]
+    print(f"Load: csv {load['csv']:.3f}s, snapshot {load['snapshot']:.3f}s, "
+          f"landmarks {load['landmarks']:.3f}s")
+    print(f"Search ({results['queries']} queries):")
+    for mode, result in results["search"].items():
+        print(f"  {mode}: median {result['median_seconds'] * 1000:.2f}ms, "
+              f"mean {result['mean_seconds'] * 1000:.2f}ms, "
+              f"explored {result['mean_explored']:.0f}, "
+              f"frontier peak {result['mean_frontier_peak']:.0f}")
+
+
+if __name__ == "__main__":
+    main()
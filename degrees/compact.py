@@ -0,0 +1,64 @@
+import csv
+
+from graph import StarGraph
+from storage import StringTable, SortedIndex, NameIndex, PeopleTable, MoviesTable
+
+
+def load_compact(directory):
+    """
+    Load the CSV files in `directory` straight into columnar storage,
+    without building a dictionary and set for every person and movie.
+
+    Every string column becomes a StringTable (one blob plus offsets),
+    the id indexes become SortedIndexes over sorted StringTables, and
+    the stars become the CSR arrays of a StarGraph.
+
+    Return (names, people, movies, graph), where `names`, `people` and
+    `movies` support the same lookups as the dictionaries built by
+    `load_data`.
+    """
+    # Load people
+    person_ids, names, births = [], [], []
+    person_index = {}
+    with open(f"{directory}/people.csv", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if row["id"] in person_index:
+                continue
+            person_index[row["id"]] = len(person_ids)
+            person_ids.append(row["id"])
+            names.append(row["name"])
+            births.append(row["birth"])
+
+    # Load movies
+    movie_ids, titles, years = [], [], []
+    movie_index = {}
+    with open(f"{directory}/movies.csv", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if row["id"] in movie_index:
+                continue
+            movie_index[row["id"]] = len(movie_ids)
+            movie_ids.append(row["id"])
+            titles.append(row["title"])
+            years.append(row["year"])
+
+    # Load stars
+    with open(f"{directory}/stars.csv", encoding="utf-8") as f:
+        edges = [(person_index[row["person_id"]], movie_index[row["movie_id"]])
+                 for row in csv.DictReader(f)
+                 if row["person_id"] in person_index and row["movie_id"] in movie_index]
+
+    # Swap the Python lists and dictionaries for compact tables
+    person_ids = StringTable.from_strings(person_ids)
+    movie_ids = StringTable.from_strings(movie_ids)
+    graph = StarGraph.from_edges(
+        person_ids, movie_ids, edges,
+        person_index=SortedIndex.from_sequence(person_ids),
+        movie_index=SortedIndex.from_sequence(movie_ids))
+    del person_index, movie_index, edges
+
+    name_index = NameIndex.from_names(names, graph.person_ids)
+    people = PeopleTable(graph, StringTable.from_strings(names),
+                         StringTable.from_strings(births))
+    movies = MoviesTable(graph, StringTable.from_strings(titles),
+                         StringTable.from_strings(years))
+    return name_index, people, movies, graph
@@ -1,7 +1,19 @@
+import argparse
 import csv
+import functools
+import itertools
+import json
+import multiprocessing
 import sys
+import time
 
-from util import Node, StackFrontier, QueueFrontier
+from compact import load_compact
+from graph import StarGraph, bfs_distances
+from landmarks import build_landmarks, load_landmarks, save_landmarks
+from snapshot import load_snapshot, save_snapshot
+from stats import SearchStats
+from storage import NameIndex
+from util import Node, IndexedQueueFrontier, PriorityFrontier
 
 # Maps names to a set of corresponding person_ids
 names = {}
@@ -12,11 +24,84 @@ people = {}
 # Maps movie_ids to a dictionary of: title, year, stars (a set of person_ids)
 movies = {}
 
+# StarGraph of people and movies with dense integer ids, built from
+# `people` and `movies` by build_graph
+graph = None
 
-def load_data(directory):
+# NameIndex of lowercase names for prefix lookups, built on first use
+name_index = None
+
+# LandmarkIndex guiding A* search, set up by use_landmarks
+landmarks = None
+
+# Number of nodes explored by the most recent call to shortest_path
+num_explored = 0
+
+# Instrumentation of the most recent load_data and shortest_path calls
+stats = SearchStats()
+
+# Number of sources whose distance tables are kept by distances_from
+DISTANCE_CACHE_SIZE = 32
+
+
+def prepare_data(directory, snapshot=True, compact=False, delta=None, num_landmarks=0):
+    """
+    Load the data in `directory` like `load_data`, then add the data in
+    the `delta` directory if given (see `load_delta`), and use an index
+    of `num_landmarks` landmarks if that is above 0 (see `use_landmarks`).
+    """
+    load_data(directory, snapshot=snapshot, compact=compact)
+    if delta is not None:
+        load_delta(delta)
+    if num_landmarks > 0:
+        use_landmarks(directory, num_landmarks)
+
+
+def load_data(directory, snapshot=True, compact=False):
     """
     Load data from CSV files into memory.
+
+    If `snapshot` is true, the data is memory-mapped from the snapshot
+    compiled on a previous load when the CSV files are unchanged, and a
+    new snapshot is written after the CSV files are parsed otherwise.
+
+    If `compact` is true, the CSV files are parsed into columnar tables
+    (see `load_compact`) rather than a dictionary and set per row.
+    `names`, `people` and `movies` keep supporting the same lookups.
+
+    The time taken and where the data came from are recorded in `stats`.
+    """
+    start = time.perf_counter()
+    stats.load_source = read_data(directory, snapshot, compact)
+    stats.load_seconds = time.perf_counter() - start
+
+
+def read_data(directory, snapshot, compact):
     """
+    load_data helper function
+
+    Returns "snapshot", "compact" or "csv" for where the data came from.
+    """
+    global names, people, movies, graph, landmarks, name_index
+    distances_from.cache_clear()
+    landmarks = None
+    name_index = None
+    if snapshot:
+        loaded = load_snapshot(directory)
+        if loaded is not None:
+            names, people, movies, graph = loaded
+            name_index = names
+            return "snapshot"
+
+    if compact:
+        names, people, movies, graph = load_compact(directory)
+        name_index = names
+        if snapshot:
+            write_snapshot(directory)
+        return "compact"
+
+    names, people, movies = {}, {}, {}
+
     # Load people
     with open(f"{directory}/people.csv", encoding="utf-8") as f:
         reader = csv.DictReader(f)
@@ -45,21 +130,216 @@ def load_data(directory):
     with open(f"{directory}/stars.csv", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for row in reader:
-            try:
+            # Skip rows naming an unknown person or movie, rather than
+            # adding a link to only one side of the graph
+            if row["person_id"] in people and row["movie_id"] in movies:
                 people[row["person_id"]]["movies"].add(row["movie_id"])
                 movies[row["movie_id"]]["stars"].add(row["person_id"])
-            except KeyError:
-                pass
+
+    build_graph()
+
+    if snapshot:
+        write_snapshot(directory)
+    return "csv"
+
+
+def write_snapshot(directory):
+    """
+    Save the loaded data as the snapshot of `directory`.
+    """
+    try:
+        save_snapshot(directory, graph, people, movies)
+    except OSError:
+        # The snapshot is only a cache, so carry on without one
+        pass
+
+
+def use_landmarks(directory, k):
+    """
+    Load the index of `k` landmarks stored next to the CSV files in
+    `directory` for A* search and distance estimates, building and
+    storing it first if it is missing or out of date.
+    """
+    global landmarks
+    if graph is None:
+        build_graph()
+    if graph.has_additions():
+        # The stored index only describes the data in `directory`
+        landmarks = build_landmarks(graph, k)
+        return
+    landmarks = load_landmarks(directory, graph, k)
+    if landmarks is None:
+        landmarks = build_landmarks(graph, k)
+        try:
+            save_landmarks(directory, graph, landmarks)
+        except OSError:
+            pass
+
+
+def build_graph():
+    """
+    Intern the loaded person and movie ids to dense integers and store
+    the star graph in compressed sparse row form for searching.
+    """
+    global graph
+    graph = StarGraph.from_data(people, movies)
+    distances_from.cache_clear()
+
+
+def load_delta(directory):
+    """
+    Add the rows of whichever of people.csv, movies.csv and stars.csv
+    exist in `directory` to the loaded data, without reloading it.
+    Rows for people and movies that are already loaded are ignored.
+    """
+    for filename, add in [("people.csv", add_person_row),
+                          ("movies.csv", add_movie_row),
+                          ("stars.csv", add_star_row)]:
+        try:
+            f = open(f"{directory}/{filename}", encoding="utf-8")
+        except FileNotFoundError:
+            continue
+        with f:
+            for row in csv.DictReader(f):
+                add(row)
+
+
+def add_person_row(row):
+    add_person(row["id"], row["name"], row["birth"])
+
+
+def add_movie_row(row):
+    add_movie(row["id"], row["title"], row["year"])
+
+
+def add_star_row(row):
+    add_star(row["person_id"], row["movie_id"])
+
+
+def add_person(person_id, name, birth):
+    """
+    Add a person to the loaded data. Returns False if they already exist.
+    """
+    global landmarks
+    if person_id in people:
+        return False
+    if graph is None:
+        build_graph()
+    person = graph.add_person(person_id)
+
+    if isinstance(people, dict):
+        people[person_id] = {"name": name, "birth": birth, "movies": set()}
+        names.setdefault(name.lower(), set()).add(person_id)
+    else:
+        people.add(name, birth)
+        names.add(name, person)
+    if name_index is not None and name_index is not names:
+        name_index.add(name, person)
+
+    # Cached distances and landmark columns only cover the people already
+    # loaded, so they have no entry for the new person
+    distances_from.cache_clear()
+    landmarks = None
+    return True
+
+
+def add_movie(movie_id, title, year):
+    """
+    Add a movie to the loaded data. Returns False if it already exists.
+    """
+    if movie_id in movies:
+        return False
+    if graph is None:
+        build_graph()
+    graph.add_movie(movie_id)
+
+    if isinstance(movies, dict):
+        movies[movie_id] = {"title": title, "year": year, "stars": set()}
+    else:
+        movies.add(title, year)
+    return True
+
+
+def add_star(person_id, movie_id):
+    """
+    Record that a loaded person starred in a loaded movie.
+    Returns False if either is unknown or this was already recorded.
+    """
+    global landmarks
+    if person_id not in people or movie_id not in movies:
+        return False
+    if graph is None:
+        build_graph()
+    person = graph.person_index[person_id]
+    movie = graph.movie_index[movie_id]
+    if not graph.add_star(person, movie):
+        return False
+
+    if isinstance(people, dict):
+        people[person_id]["movies"].add(movie_id)
+        movies[movie_id]["stars"].add(person_id)
+
+    # New links can shorten any path, so cached distances are now stale
+    distances_from.cache_clear()
+    landmarks = None
+    return True
+
+
+def people_for_prefix(prefix, limit=10):
+    """
+    Returns up to `limit` person_ids whose names start with `prefix`
+    (ignoring case), in name order.
+    """
+    global name_index
+    if name_index is None:
+        if graph is None:
+            build_graph()
+        name_index = NameIndex.from_names(
+            [people[person_id]["name"] for person_id in graph.person_ids],
+            graph.person_ids)
+    return [person_id for _, person_id
+            in itertools.islice(name_index.prefix(prefix), limit)]
 
 
 def main():
-    if len(sys.argv) > 2:
-        sys.exit("Usage: python degrees.py [directory]")
-    directory = sys.argv[1] if len(sys.argv) == 2 else "large"
+    parser = argparse.ArgumentParser(usage="python degrees.py [directory]")
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("--bidirectional", action="store_true",
+                        help="search from both ends and stop when they meet")
+    parser.add_argument("--no-snapshot", action="store_true",
+                        help="always parse the CSV files, ignoring any snapshot")
+    parser.add_argument("--compact", action="store_true",
+                        help="keep the data in compact columnar tables")
+    parser.add_argument("--delta", metavar="DIRECTORY",
+                        help="add the people, movies and stars in DIRECTORY after loading")
+    parser.add_argument("--landmarks", type=int, default=0, metavar="K",
+                        help="use an index of K landmarks for estimates and A* search")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="answer tab-separated source/target pairs from FILE "
+                             "('-' for stdin) as JSON lines")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes answering batch queries")
+    parser.add_argument("--stats", action="store_true",
+                        help="report load and search instrumentation")
+    args = parser.parse_args()
+    stats.enabled = args.stats
+
+    data = (args.directory, not args.no_snapshot, args.compact, args.delta, args.landmarks)
+
+    if args.batch is not None:
+        prepare_data(*data)
+        if args.batch == "-":
+            run_batch(sys.stdin, sys.stdout, data,
+                      args.bidirectional, args.workers, args.stats)
+        else:
+            with open(args.batch, encoding="utf-8") as f:
+                run_batch(f, sys.stdout, data,
+                          args.bidirectional, args.workers, args.stats)
+        return
 
     # Load data from files into memory
     print("Loading data...")
-    load_data(directory)
+    prepare_data(*data)
     print("Data loaded.")
 
     source = person_id_for_name(input("Name: "))
@@ -69,7 +349,19 @@ def main():
     if target is None:
         sys.exit("Person not found.")
 
-    path = shortest_path(source, target)
+    if landmarks is not None:
+        lower, upper = estimate_distance(source, target)
+        if lower is None:
+            print("Estimate: not connected.")
+        elif upper is None:
+            print(f"Estimate: at least {lower} degrees of separation.")
+        else:
+            print(f"Estimate: {lower} to {upper} degrees of separation.")
+
+    path = shortest_path(source, target, bidirectional=args.bidirectional,
+                         astar=landmarks is not None)
+    if args.stats:
+        print(stats.report())
 
     if path is None:
         print("Not connected.")
@@ -84,23 +376,39 @@ def main():
             print(f"{i + 1}: {person1} and {person2} starred in {movie}")
 
 
-def shortest_path(source, target):
+def shortest_path(source, target, bidirectional=False, astar=False):
     """
     Returns the shortest list of (movie_id, person_id) pairs
     that connect the source to the target.
 
+    If `bidirectional` is true, the search grows from both ends
+    (see `bidirectional_shortest_path`). Otherwise, if `astar` is true,
+    the search is guided by the landmarks (see `astar_shortest_path`).
+
     If no possible path, returns None.
     """
+    if bidirectional:
+        return bidirectional_shortest_path(source, target)
+    if astar:
+        return astar_shortest_path(source, target)
 
     # For keeping track of how many nodes have been explored
+    global num_explored
     num_explored = 0
+    stats.reset("bfs")
     
     if source == target:
         path = []
         return path
 
+    if graph is None:
+        build_graph()
+    source = graph.person_index[source]
+    target = graph.person_index[target]
+    neighbors = expand if stats.enabled else graph.neighbors
+
     start = Node(state=source, parent=None, action=None)
-    frontier = QueueFrontier()
+    frontier = IndexedQueueFrontier()
     frontier.add(start)
 
     # Set of explored actors
@@ -113,13 +421,12 @@ def shortest_path(source, target):
 
         node = frontier.remove()
         #printf("Exploring {node.state}")
-        num_explored += 1
 
         # Mark actor (node) as explored
         explored.add(node.state)
+        num_explored += 1
         # Find the neighbors (actors to which he can connect) of the actor
-        neighbors = neighbors_for_person(node.state)
-        for movie, actor in neighbors:
+        for movie, actor in neighbors(node.state):
             if actor not in explored and not frontier.contains_state(actor):
                 child = Node(state=actor, parent=node, action=movie)
                 if child.state == target:
@@ -127,13 +434,199 @@ def shortest_path(source, target):
                     path = []
                     node = child
                     while node.parent is not None:
-                        path.append((node.action, node.state))
+                        path.append((graph.movie_ids[node.action],
+                                     graph.person_ids[node.state]))
                         node = node.parent
 
                     path.reverse()
                     return path
                 frontier.add(child)
-                
+                stats.frontier_size(len(frontier.frontier))
+
+
+def astar_shortest_path(source, target):
+    """
+    Returns the same path as `shortest_path`, using A* search with the
+    landmark lower bounds as heuristic so that people leading away
+    from the target are expanded last, and people the landmarks show
+    cannot reach the target are never expanded.
+
+    Without landmarks the heuristic is 0, i.e. a uniform cost search.
+
+    If no possible path, returns None.
+    """
+    global num_explored
+    num_explored = 0
+    stats.reset("astar")
+
+    if source == target:
+        return []
+
+    if graph is None:
+        build_graph()
+    source = graph.person_index[source]
+    target = graph.person_index[target]
+    neighbors = expand if stats.enabled else graph.neighbors
+    if landmarks is not None:
+        heuristic = landmarks.heuristic(target)
+    else:
+        heuristic = lambda person: 0
+
+    # Cost of the cheapest known path to each reached actor
+    costs = {source: 0}
+    frontier = PriorityFrontier()
+    if heuristic(source) is not None:
+        frontier.add(Node(state=source, parent=None, action=None), heuristic(source))
+
+    explored = set()
+    while not frontier.empty():
+        node = frontier.remove()
+        if node.state == target:
+            path = []
+            while node.parent is not None:
+                path.append((graph.movie_ids[node.action],
+                             graph.person_ids[node.state]))
+                node = node.parent
+            path.reverse()
+            return path
+
+        explored.add(node.state)
+        num_explored += 1
+        cost = costs[node.state] + 1
+        for movie, actor in neighbors(node.state):
+            if actor in explored or cost >= costs.get(actor, cost + 1):
+                continue
+            estimate = heuristic(actor)
+            if estimate is None:
+                continue
+            costs[actor] = cost
+            frontier.add(Node(state=actor, parent=node, action=movie), cost + estimate)
+            stats.frontier_size(len(frontier.priorities))
+
+    return None
+
+
+def estimate_distance(source, target):
+    """
+    Returns (lower, upper) bounds on the degrees of separation between
+    `source` and `target` from the landmarks alone. `upper` is None if
+    no landmark reaches both, and both are None if they are known not
+    to be connected.
+    """
+    if landmarks is None:
+        return 0, None
+    return landmarks.bounds(graph.person_index[source], graph.person_index[target])
+
+
+@functools.lru_cache(maxsize=DISTANCE_CACHE_SIZE)
+def distances_from(source):
+    """
+    Returns a DistanceTable holding every person's degrees of separation
+    from `source` and a parent pointer back along a shortest path, so
+    that `table.path_to(target)` takes time proportional to the path.
+
+    Tables for the most recently used sources are cached, and the cache
+    is cleared whenever data is loaded.
+    """
+    if graph is None:
+        build_graph()
+    return bfs_distances(graph, graph.person_index[source])
+
+
+def bidirectional_shortest_path(source, target):
+    """
+    Returns the same path as `shortest_path`, but searches breadth-first
+    from both `source` and `target` at once, always expanding one whole
+    layer of the smaller frontier, and stops once the two searches meet.
+
+    If no possible path, returns None.
+    """
+    global num_explored
+    num_explored = 0
+    stats.reset("bidirectional")
+
+    if source == target:
+        return []
+
+    if graph is None:
+        build_graph()
+    source = graph.person_index[source]
+    target = graph.person_index[target]
+    neighbors = expand if stats.enabled else graph.neighbors
+
+    # Map each reached actor to (actor one step closer to that side's
+    # start, movie linking them) and to their distance from that start
+    parents = ({source: None}, {target: None})
+    depths = ({source: 0}, {target: 0})
+    layers = ([source], [target])
+
+    while layers[0] and layers[1]:
+        # Expand the side with the smaller frontier
+        side = 0 if len(layers[0]) <= len(layers[1]) else 1
+        other = 1 - side
+        next_layer = []
+        best = None
+
+        for actor in layers[side]:
+            num_explored += 1
+            for movie, neighbor in neighbors(actor):
+                if neighbor in parents[side]:
+                    continue
+                parents[side][neighbor] = (actor, movie)
+                depths[side][neighbor] = depths[side][actor] + 1
+                next_layer.append(neighbor)
+
+                # Searches have met: keep the shortest meeting point
+                if neighbor in parents[other]:
+                    length = depths[side][neighbor] + depths[other][neighbor]
+                    if best is None or length < best[0]:
+                        best = (length, neighbor)
+
+        stats.frontier_size(len(next_layer) + len(layers[other]))
+        if best is not None:
+            return join_paths(parents[0], parents[1], best[1])
+        layers = (next_layer, layers[1]) if side == 0 else (layers[0], next_layer)
+
+    return None
+
+
+def expand(person):
+    """
+    Returns the (movie, person) index pairs of the neighbors of person
+    index `person` as a list, timing the expansion in `stats`.
+
+    Searches only call this while stats are enabled, and otherwise walk
+    `graph.neighbors` directly.
+    """
+    start = time.perf_counter()
+    neighbors = list(graph.neighbors(person))
+    stats.expand_seconds += time.perf_counter() - start
+    stats.nodes_explored = num_explored
+    return neighbors
+
+
+def join_paths(forward, backward, meeting):
+    """
+    bidirectional_shortest_path helper function
+
+    Returns the list of (movie_id, person_id) pairs from the start of
+    `forward` through `meeting` to the start of `backward`.
+    """
+    path = []
+    actor = meeting
+    while forward[actor] is not None:
+        parent, movie = forward[actor]
+        path.append((graph.movie_ids[movie], graph.person_ids[actor]))
+        actor = parent
+    path.reverse()
+
+    actor = meeting
+    while backward[actor] is not None:
+        child, movie = backward[actor]
+        path.append((graph.movie_ids[movie], graph.person_ids[child]))
+        actor = child
+    return path
+
 
 def person_id_for_name(name):
     """
@@ -161,6 +654,103 @@ def person_id_for_name(name):
         return person_ids[0]
 
 
+def resolve_person(value):
+    """
+    Returns the person_id for `value`, which may be a person_id or a
+    name, without prompting.
+
+    Raises ValueError if no person or more than one person matches.
+    """
+    if value in people:
+        return value
+    person_ids = names.get(value.lower(), set())
+    if len(person_ids) == 0:
+        raise ValueError(f"person not found: {value}")
+    elif len(person_ids) > 1:
+        raise ValueError(f"ambiguous name: {value}")
+    return next(iter(person_ids))
+
+
+def answer_query(line, bidirectional=False, include_stats=False):
+    """
+    Returns a JSON-serializable result for one batch query line holding
+    a source and a target separated by a tab, or None for a blank line.
+    If `include_stats` is true, the result holds the search's `stats`.
+    """
+    stats.enabled = include_stats
+    line = line.rstrip("\r\n")
+    if not line.strip():
+        return None
+    fields = line.split("\t")
+    if len(fields) != 2:
+        return {"query": line, "error": "expected source<TAB>target"}
+    result = {"source": fields[0], "target": fields[1]}
+    try:
+        source = resolve_person(fields[0])
+        target = resolve_person(fields[1])
+    except ValueError as error:
+        result["error"] = str(error)
+        return result
+
+    path = shortest_path(source, target, bidirectional=bidirectional,
+                         astar=landmarks is not None)
+    result["source_id"] = source
+    result["target_id"] = target
+    result["degrees"] = None if path is None else len(path)
+    result["path"] = path
+    result["explored"] = num_explored
+    if include_stats:
+        result["stats"] = stats.as_dict()
+    return result
+
+
+def run_batch(lines, out, data, bidirectional=False, workers=1,
+              include_stats=False):
+    """
+    Answer every query in `lines` against the loaded data, writing one
+    JSON object per query to `out` in input order.
+
+    With more than one worker the queries are fanned out over a process
+    pool. Where processes are forked, workers share the loaded graph
+    copy-on-write; otherwise each worker loads the data itself, by
+    passing the tuple `data` to `prepare_data` as the loaded data was.
+    """
+    if workers <= 1:
+        results = (answer_query(line, bidirectional, include_stats)
+                   for line in lines)
+        write_results(results, out)
+        return
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    with context.Pool(workers, initializer=init_worker, initargs=(data,)) as pool:
+        tasks = ((line, bidirectional, include_stats) for line in lines)
+        write_results(pool.imap(answer_task, tasks, chunksize=256), out)
+
+
+def write_results(results, out):
+    for result in results:
+        if result is not None:
+            out.write(json.dumps(result) + "\n")
+
+
+def init_worker(data):
+    """
+    run_batch helper function
+
+    Loads the data in a worker process unless it was inherited by fork.
+    """
+    if graph is None:
+        prepare_data(*data)
+
+
+def answer_task(task):
+    """
+    run_batch helper function
+    """
+    return answer_query(*task)
+
+
 def neighbors_for_person(person_id):
     """
     Returns (movie_id, person_id) pairs for people
@@ -0,0 +1,270 @@
+from array import array
+from collections import deque
+
+from storage import appendable, writable
+
+
+class StarGraph():
+    """
+    Bipartite graph of people and the movies they starred in.
+
+    Person and movie ids are interned to dense integers (their position
+    in `person_ids` / `movie_ids`), and both sides of the graph are kept
+    in compressed sparse row form: the movies of person `p` are
+    `person_movies[person_offsets[p]:person_offsets[p + 1]]`, and the
+    stars of movie `m` are `movie_stars[movie_offsets[m]:movie_offsets[m + 1]]`.
+
+    `person_index` and `movie_index` map ids back to their integers, and
+    are built as dictionaries unless another mapping is given.
+
+    People, movies and stars added after the graph is built are kept
+    outside the CSR arrays, in `added_movies` (person -> movie list) and
+    `added_stars` (movie -> person list).
+    """
+    def __init__(self, person_ids, movie_ids, person_offsets, person_movies,
+                 movie_offsets, movie_stars, person_index=None, movie_index=None):
+        self.person_ids = appendable(person_ids)
+        self.movie_ids = appendable(movie_ids)
+        self.person_offsets = person_offsets
+        self.person_movies = person_movies
+        self.movie_offsets = movie_offsets
+        self.movie_stars = movie_stars
+        if person_index is None:
+            person_index = {person_id: i for i, person_id in enumerate(person_ids)}
+        if movie_index is None:
+            movie_index = {movie_id: i for i, movie_id in enumerate(movie_ids)}
+        self.person_index = writable(person_index)
+        self.movie_index = writable(movie_index)
+        self.base_people = len(person_offsets) - 1
+        self.base_movies = len(movie_offsets) - 1
+        self.added_movies = {}
+        self.added_stars = {}
+
+    @classmethod
+    def from_data(cls, people, movies):
+        """
+        Build a graph from the `people` and `movies` dictionaries
+        filled in by `load_data`.
+        """
+        person_ids = list(people)
+        movie_ids = list(movies)
+        person_index = {person_id: i for i, person_id in enumerate(person_ids)}
+        movie_index = {movie_id: i for i, movie_id in enumerate(movie_ids)}
+
+        person_offsets = array("q", [0])
+        person_movies = array("i")
+        for person_id in person_ids:
+            person_movies.extend(movie_index[movie_id]
+                                 for movie_id in people[person_id]["movies"])
+            person_offsets.append(len(person_movies))
+
+        movie_offsets = array("q", [0])
+        movie_stars = array("i")
+        for movie_id in movie_ids:
+            movie_stars.extend(person_index[person_id]
+                               for person_id in movies[movie_id]["stars"])
+            movie_offsets.append(len(movie_stars))
+
+        return cls(person_ids, movie_ids, person_offsets, person_movies,
+                   movie_offsets, movie_stars, person_index, movie_index)
+
+    @classmethod
+    def from_edges(cls, person_ids, movie_ids, edges, person_index=None,
+                   movie_index=None):
+        """
+        Build a graph from sequences of ids and an iterable of
+        (person, movie) index pairs, ignoring repeated pairs.
+        """
+        num_movies = len(movie_ids)
+
+        # Sort the edges by person, then movie, as single integers
+        keys = array("q", sorted(set(person * num_movies + movie
+                                     for person, movie in edges)))
+
+        person_offsets = array("q", [0]) * (len(person_ids) + 1)
+        person_movies = array("i", [0]) * len(keys)
+        movie_offsets = array("q", [0]) * (num_movies + 1)
+        for i, key in enumerate(keys):
+            person, movie = divmod(key, num_movies)
+            person_offsets[person + 1] += 1
+            person_movies[i] = movie
+            movie_offsets[movie + 1] += 1
+        for i in range(len(person_ids)):
+            person_offsets[i + 1] += person_offsets[i]
+        for i in range(num_movies):
+            movie_offsets[i + 1] += movie_offsets[i]
+
+        # Fill each movie's stars in person order
+        movie_stars = array("i", [0]) * len(keys)
+        fill = movie_offsets[:-1]
+        for key in keys:
+            person, movie = divmod(key, num_movies)
+            movie_stars[fill[movie]] = person
+            fill[movie] += 1
+
+        return cls(person_ids, movie_ids, person_offsets, person_movies,
+                   movie_offsets, movie_stars, person_index, movie_index)
+
+    def num_people(self):
+        return len(self.person_ids)
+
+    def num_movies(self):
+        return len(self.movie_ids)
+
+    def movies_for_person(self, person):
+        """
+        Yields the movie indices of the movies person `person` starred in.
+        """
+        if person < self.base_people:
+            yield from range_values(self.person_movies, self.person_offsets, person)
+        yield from self.added_movies.get(person, ())
+
+    def stars_for_movie(self, movie):
+        """
+        Yields the person indices of the stars of movie `movie`.
+        """
+        if movie < self.base_movies:
+            yield from range_values(self.movie_stars, self.movie_offsets, movie)
+        yield from self.added_stars.get(movie, ())
+
+    def neighbors(self, person):
+        """
+        Yields (movie, person) index pairs for people who starred
+        with person `person`, including `person` themself.
+        """
+        if self.added_stars or person >= self.base_people:
+            for movie in self.movies_for_person(person):
+                for star in self.stars_for_movie(movie):
+                    yield movie, star
+            return
+
+        # Nothing was added, so walk the CSR arrays directly
+        person_movies = self.person_movies
+        movie_offsets = self.movie_offsets
+        movie_stars = self.movie_stars
+        for i in range(self.person_offsets[person], self.person_offsets[person + 1]):
+            movie = person_movies[i]
+            for j in range(movie_offsets[movie], movie_offsets[movie + 1]):
+                yield movie, movie_stars[j]
+
+    def degree(self, person):
+        """
+        Returns the number of movies person `person` starred in.
+        """
+        degree = len(self.added_movies.get(person, ()))
+        if person < self.base_people:
+            degree += self.person_offsets[person + 1] - self.person_offsets[person]
+        return degree
+
+    def has_additions(self):
+        """
+        Returns True if anything was added since the graph was built.
+        """
+        return (self.num_people() > self.base_people
+                or self.num_movies() > self.base_movies
+                or len(self.added_stars) > 0)
+
+    def add_person(self, person_id):
+        """
+        Returns the index of `person_id`, adding them if they are new.
+        """
+        if person_id in self.person_index:
+            return self.person_index[person_id]
+        self.person_index[person_id] = len(self.person_ids)
+        self.person_ids.append(person_id)
+        return self.person_index[person_id]
+
+    def add_movie(self, movie_id):
+        """
+        Returns the index of `movie_id`, adding it if it is new.
+        """
+        if movie_id in self.movie_index:
+            return self.movie_index[movie_id]
+        self.movie_index[movie_id] = len(self.movie_ids)
+        self.movie_ids.append(movie_id)
+        return self.movie_index[movie_id]
+
+    def add_star(self, person, movie):
+        """
+        Records that person `person` starred in movie `movie`.
+        Returns False if that was already known.
+        """
+        if movie in self.movies_for_person(person):
+            return False
+        self.added_movies.setdefault(person, []).append(movie)
+        self.added_stars.setdefault(movie, []).append(person)
+        return True
+
+
+def range_values(values, offsets, row):
+    """
+    Yields the entries of CSR row `row`.
+    """
+    for i in range(offsets[row], offsets[row + 1]):
+        yield values[i]
+
+
+class DistanceTable():
+    """
+    Breadth-first search tree of a StarGraph from one source person.
+
+    `distances[p]` is the number of degrees between the source and
+    person `p` (-1 if they are not connected), and `parent_people[p]` /
+    `parent_movies[p]` are the person and movie one step closer to the
+    source on a shortest path.
+    """
+    def __init__(self, graph, source, distances, parent_people, parent_movies):
+        self.graph = graph
+        self.source = source
+        self.distances = distances
+        self.parent_people = parent_people
+        self.parent_movies = parent_movies
+
+    def distance_to(self, person_id):
+        """
+        Returns the degrees of separation between the source and
+        `person_id`, or None if they are not connected.
+        """
+        distance = self.distances[self.graph.person_index[person_id]]
+        return None if distance < 0 else distance
+
+    def path_to(self, person_id):
+        """
+        Returns the shortest list of (movie_id, person_id) pairs that
+        connect the source to `person_id`, or None if there is none.
+        """
+        person = self.graph.person_index[person_id]
+        if self.distances[person] < 0:
+            return None
+        path = []
+        while person != self.source:
+            path.append((self.graph.movie_ids[self.parent_movies[person]],
+                         self.graph.person_ids[person]))
+            person = self.parent_people[person]
+        path.reverse()
+        return path
+
+
+def bfs_distances(graph, source):
+    """
+    Returns the DistanceTable of a breadth-first search over the whole
+    graph from person `source`.
+    """
+    n = graph.num_people()
+    distances = array("i", [-1]) * n
+    parent_people = array("i", [-1]) * n
+    parent_movies = array("i", [-1]) * n
+    distances[source] = 0
+
+    frontier = deque([source])
+    while frontier:
+        person = frontier.popleft()
+        distance = distances[person] + 1
+        for movie, neighbor in graph.neighbors(person):
+            if distances[neighbor] < 0:
+                distances[neighbor] = distance
+                parent_people[neighbor] = person
+                parent_movies[neighbor] = movie
+                frontier.append(neighbor)
+
+    return DistanceTable(graph, source, distances, parent_people, parent_movies)
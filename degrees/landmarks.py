@@ -0,0 +1,128 @@
+import os
+from array import array
+
+from graph import bfs_distances
+from snapshot import (read_meta, sources_unchanged, source_fingerprints, staged_directory,
+                      write_array, map_array)
+
+# Layout version of the landmark files, checked by read_meta
+VERSION = 1
+
+
+class LandmarkIndex():
+    """
+    Breadth-first distances from a few landmark people to everyone else.
+
+    By the triangle inequality, the degrees of separation between any
+    two people differ from their distances to a landmark by at most the
+    distance between them, which gives cheap lower and upper bounds on
+    every query and an admissible heuristic for A* search.
+
+    `distances[i][p]` is the distance from landmark `landmarks[i]` to
+    person `p`, or -1 if they are not connected.
+    """
+    def __init__(self, landmarks, distances):
+        self.landmarks = landmarks
+        self.distances = distances
+
+    def bounds(self, source, target):
+        """
+        Returns (lower, upper) bounds on the degrees of separation between
+        person indices `source` and `target`. `upper` is None if no
+        landmark reaches both, and both are None if the landmarks show
+        that the two are not connected.
+        """
+        lower = 0
+        upper = None
+        for distances in self.distances:
+            source_distance = distances[source]
+            target_distance = distances[target]
+            if source_distance < 0 and target_distance < 0:
+                continue
+            if source_distance < 0 or target_distance < 0:
+                return None, None
+            lower = max(lower, abs(source_distance - target_distance))
+            if upper is None or source_distance + target_distance < upper:
+                upper = source_distance + target_distance
+        return lower, upper
+
+    def heuristic(self, target):
+        """
+        Returns a function estimating the degrees of separation between a
+        person index and person index `target` without overestimating.
+        The function returns None for people that cannot reach `target`.
+        """
+        columns = [(distances, distances[target]) for distances in self.distances]
+
+        def estimate(person):
+            best = 0
+            for distances, target_distance in columns:
+                distance = distances[person]
+                if (distance < 0) != (target_distance < 0):
+                    return None
+                if distance >= 0 and abs(distance - target_distance) > best:
+                    best = abs(distance - target_distance)
+            return best
+
+        return estimate
+
+
+def build_landmarks(graph, k):
+    """
+    Returns a LandmarkIndex for the `k` people who starred in the
+    most movies, each with the distances of one breadth-first search.
+    """
+    people = sorted(range(graph.num_people()), key=graph.degree, reverse=True)
+    landmarks = array("i", people[:k])
+    distances = [array("h", bfs_distances(graph, landmark).distances)
+                 for landmark in landmarks]
+    return LandmarkIndex(landmarks, distances)
+
+
+def landmarks_path(directory):
+    """
+    Return the directory holding the landmark index of the CSV files in `directory`.
+    """
+    return os.path.join(directory, ".landmarks")
+
+
+def save_landmarks(directory, graph, index):
+    """
+    Store `index` next to the CSV files in `directory`, with the
+    landmarks as person_ids and all distances in one array.
+    """
+    distances = array("h")
+    for column in index.distances:
+        distances.extend(column)
+
+    meta = {
+        "sources": source_fingerprints(directory),
+        "num_people": graph.num_people(),
+        "landmarks": [graph.person_ids[landmark] for landmark in index.landmarks],
+    }
+    with staged_directory(landmarks_path(directory), VERSION, meta) as staging:
+        write_array(os.path.join(staging, "distances.bin"), distances, "h")
+
+
+def load_landmarks(directory, graph, k):
+    """
+    Return the LandmarkIndex of `k` landmarks stored next to the CSV
+    files in `directory`, memory-mapped, or None if there is none or it
+    was built from different data.
+    """
+    k = min(k, graph.num_people())
+    path = landmarks_path(directory)
+    meta = read_meta(path, VERSION)
+    if meta is None:
+        return None
+    if meta["num_people"] != graph.num_people() or len(meta["landmarks"]) != k:
+        return None
+    if not sources_unchanged(directory, meta, path):
+        return None
+
+    n = graph.num_people()
+    distances = map_array(os.path.join(path, "distances.bin"), "h")
+    landmarks = array("i", (graph.person_index[person_id]
+                            for person_id in meta["landmarks"]))
+    return LandmarkIndex(landmarks, [distances[i * n:(i + 1) * n]
+                                     for i in range(k)])
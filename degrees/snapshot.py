@@ -0,0 +1,250 @@
+import contextlib
+import hashlib
+import json
+import mmap
+import os
+import shutil
+from array import array
+
+from graph import StarGraph
+from storage import StringTable, SortedIndex, NameIndex, PeopleTable, MoviesTable
+
+# Layout version of the snapshot files, checked by read_meta
+VERSION = 1
+
+SOURCES = ["people.csv", "movies.csv", "stars.csv"]
+
+ARRAYS = {
+    "person_offsets": "q",
+    "person_movies": "i",
+    "movie_offsets": "q",
+    "movie_stars": "i",
+    "person_order": "i",
+    "movie_order": "i",
+    "name_people": "i",
+}
+
+STRINGS = [
+    "person_ids", "names", "births",
+    "movie_ids", "titles", "years",
+    "sorted_person_ids", "sorted_movie_ids", "sorted_names",
+]
+
+
+def snapshot_path(directory):
+    """
+    Return the directory holding the snapshot of the CSV files in `directory`.
+    """
+    return os.path.join(directory, ".snapshot")
+
+
+def save_snapshot(directory, graph, people, movies):
+    """
+    Compile the loaded data into a snapshot next to the CSV files:
+    the star graph and the id and name indexes as raw arrays, and every
+    string column as a UTF-8 blob plus an offsets array.
+    """
+    names, births = person_columns(graph, people)
+    titles, years = movie_columns(graph, movies)
+    person_index = SortedIndex.from_sequence(graph.person_ids)
+    movie_index = SortedIndex.from_sequence(graph.movie_ids)
+    name_index = NameIndex.from_names(names, graph.person_ids)
+
+    arrays = {
+        "person_offsets": graph.person_offsets,
+        "person_movies": graph.person_movies,
+        "movie_offsets": graph.movie_offsets,
+        "movie_stars": graph.movie_stars,
+        "person_order": person_index.values_array,
+        "movie_order": movie_index.values_array,
+        "name_people": name_index.people_array,
+    }
+    strings = {
+        "person_ids": StringTable.from_strings(graph.person_ids),
+        "names": StringTable.from_strings(names),
+        "births": StringTable.from_strings(births),
+        "movie_ids": StringTable.from_strings(graph.movie_ids),
+        "titles": StringTable.from_strings(titles),
+        "years": StringTable.from_strings(years),
+        "sorted_person_ids": person_index.keys_table,
+        "sorted_movie_ids": movie_index.keys_table,
+        "sorted_names": name_index.keys_table,
+    }
+
+    meta = {"sources": source_fingerprints(directory)}
+    with staged_directory(snapshot_path(directory), VERSION, meta) as staging:
+        for name, values in arrays.items():
+            write_array(os.path.join(staging, f"{name}.bin"), values, ARRAYS[name])
+        for name, table in strings.items():
+            with open(os.path.join(staging, f"{name}.str"), "wb") as f:
+                f.write(table.blob)
+            write_array(os.path.join(staging, f"{name}.off"), table.offsets, "q")
+
+
+def load_snapshot(directory):
+    """
+    Return (names, people, movies, graph) memory-mapped from the snapshot
+    of `directory`, or None if there is no snapshot or the CSV files
+    have changed since it was written.
+    """
+    path = snapshot_path(directory)
+    meta = read_meta(path, VERSION)
+    if meta is None:
+        return None
+    if not sources_unchanged(directory, meta, path):
+        return None
+
+    arrays = {name: map_array(os.path.join(path, f"{name}.bin"), typecode)
+              for name, typecode in ARRAYS.items()}
+    strings = {name: StringTable(map_bytes(os.path.join(path, f"{name}.str")),
+                                 map_array(os.path.join(path, f"{name}.off"), "q"))
+               for name in STRINGS}
+
+    graph = StarGraph(
+        strings["person_ids"], strings["movie_ids"],
+        arrays["person_offsets"], arrays["person_movies"],
+        arrays["movie_offsets"], arrays["movie_stars"],
+        person_index=SortedIndex(strings["sorted_person_ids"], arrays["person_order"]),
+        movie_index=SortedIndex(strings["sorted_movie_ids"], arrays["movie_order"]))
+    names = NameIndex(strings["sorted_names"], arrays["name_people"], graph.person_ids)
+    people = PeopleTable(graph, strings["names"], strings["births"])
+    movies = MoviesTable(graph, strings["titles"], strings["years"])
+    return names, people, movies, graph
+
+
+def person_columns(graph, people):
+    """
+    Return the names and births of the people in `graph`, in index order.
+    """
+    if isinstance(people, PeopleTable):
+        return people.names, people.births
+    return ([people[person_id]["name"] for person_id in graph.person_ids],
+            [people[person_id]["birth"] for person_id in graph.person_ids])
+
+
+def movie_columns(graph, movies):
+    """
+    Return the titles and years of the movies in `graph`, in index order.
+    """
+    if isinstance(movies, MoviesTable):
+        return movies.titles, movies.years
+    return ([movies[movie_id]["title"] for movie_id in graph.movie_ids],
+            [movies[movie_id]["year"] for movie_id in graph.movie_ids])
+
+
+@contextlib.contextmanager
+def staged_directory(path, version, meta):
+    """
+    Yield a staging directory beside `path` to write files into. Once
+    they are written, `meta` is stored in its meta.json along with the
+    layout `version`, and the staging directory replaces `path`, so
+    readers never see a partly written directory. If writing fails,
+    the staging directory is removed and `path` is left as it was.
+    """
+    staging = path + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    try:
+        yield staging
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump({"version": version, **meta}, f, indent=2)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(staging, path)
+
+
+def read_meta(path, version):
+    """
+    Return the meta.json stored by `staged_directory` in `path`, or None
+    if there is none or its files were written with a layout other than
+    `version`, which each module bumps whenever its layout changes.
+    """
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(meta, dict) or meta.get("version") != version:
+        return None
+    return meta
+
+
+def sources_unchanged(directory, meta, path):
+    """
+    Return True if every CSV file in `directory` still matches the
+    fingerprint recorded in `meta`, read from the meta.json in `path`.
+
+    Files whose size and mtime are unchanged are trusted without reading
+    them; files that were only touched are accepted if their hash still
+    matches, and the new mtime is recorded so they are not hashed again.
+    """
+    touched = False
+    for source in SOURCES:
+        recorded = meta["sources"].get(source)
+        try:
+            stat = os.stat(os.path.join(directory, source))
+        except OSError:
+            return False
+        if recorded is None or stat.st_size != recorded["size"]:
+            return False
+        if stat.st_mtime_ns == recorded["mtime_ns"]:
+            continue
+        current = fingerprint(os.path.join(directory, source))
+        if current["sha256"] != recorded["sha256"]:
+            return False
+        meta["sources"][source] = current
+        touched = True
+
+    if touched:
+        try:
+            with open(os.path.join(path, "meta.json"), "w") as f:
+                json.dump(meta, f, indent=2)
+        except OSError:
+            pass
+    return True
+
+
+def source_fingerprints(directory):
+    return {source: fingerprint(os.path.join(directory, source))
+            for source in SOURCES}
+
+
+def fingerprint(filename):
+    """
+    Return the size, mtime and SHA-256 of a file.
+    """
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    stat = os.stat(filename)
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": digest.hexdigest(),
+    }
+
+
+def write_array(filename, values, typecode):
+    if not isinstance(values, array) or values.typecode != typecode:
+        values = array(typecode, values)
+    with open(filename, "wb") as f:
+        values.tofile(f)
+
+
+def map_bytes(filename):
+    """
+    Return a read-only memoryview of a file's contents, memory-mapped
+    so that pages are only read from disk when they are touched.
+    """
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return memoryview(b"")
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def map_array(filename, typecode):
+    return map_bytes(filename).cast(typecode)
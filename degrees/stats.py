@@ -0,0 +1,54 @@
+class SearchStats():
+    """
+    Instrumentation for the most recent data load and search.
+
+    Searches call `reset` when they start, then count every person they
+    expand, the time spent listing those people's neighbors, and the
+    largest number of people waiting in the frontier at once.
+
+    Expansions are only recorded while `enabled` is true, since timing
+    each one slows every search down.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.load_source = None
+        self.load_seconds = 0.0
+        self.reset()
+
+    def reset(self, mode=None):
+        """
+        Clear the search counters before a search in `mode`.
+        """
+        self.mode = mode
+        self.nodes_explored = 0
+        self.frontier_peak = 0
+        self.expand_seconds = 0.0
+
+    def frontier_size(self, size):
+        """
+        Record that `size` people are waiting in the frontier.
+        """
+        if size > self.frontier_peak:
+            self.frontier_peak = size
+
+    def as_dict(self):
+        return {
+            "load_source": self.load_source,
+            "load_seconds": self.load_seconds,
+            "mode": self.mode,
+            "nodes_explored": self.nodes_explored,
+            "frontier_peak": self.frontier_peak,
+            "expand_seconds": self.expand_seconds,
+        }
+
+    def report(self):
+        """
+        Return the counters as lines of text.
+        """
+        return "\n".join([
+            f"Loaded from {self.load_source} in {self.load_seconds:.3f}s.",
+            f"Search mode: {self.mode}",
+            f"Nodes explored: {self.nodes_explored}",
+            f"Frontier peak: {self.frontier_peak}",
+            f"Neighbor expansion: {self.expand_seconds:.6f}s",
+        ])
@@ -0,0 +1,297 @@
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Mapping, Sequence
+
+
+class StringTable(Sequence):
+    """
+    Read-only sequence of strings stored as one UTF-8 blob, where string
+    `i` is `blob[offsets[i]:offsets[i + 1]]`. Strings are only decoded
+    when they are looked up, so the blob may be a memory-mapped file.
+    """
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings):
+        offsets = array("q", [0])
+        chunks = []
+        size = 0
+        for string in strings:
+            chunk = string.encode("utf-8")
+            chunks.append(chunk)
+            size += len(chunk)
+            offsets.append(size)
+        return cls(b"".join(chunks), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("string table index out of range")
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+
+class AppendableSequence(Sequence):
+    """
+    Read-only sequence (such as a memory-mapped StringTable) followed by
+    a list of items appended to it since.
+    """
+    def __init__(self, base):
+        self.base = base
+        self.added = []
+
+    def __len__(self):
+        return len(self.base) + len(self.added)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i < len(self.base):
+            return self.base[i]
+        return self.added[i - len(self.base)]
+
+    def append(self, item):
+        self.added.append(item)
+
+
+class OverlayMapping(Mapping):
+    """
+    Read-only mapping (such as a SortedIndex) overlaid with a dictionary
+    of items added to it since.
+    """
+    def __init__(self, base):
+        self.base = base
+        self.added = {}
+
+    def __getitem__(self, key):
+        if key in self.added:
+            return self.added[key]
+        return self.base[key]
+
+    def __setitem__(self, key, value):
+        self.added[key] = value
+
+    def __iter__(self):
+        yield from self.base
+        for key in self.added:
+            if key not in self.base:
+                yield key
+
+    def __len__(self):
+        return len(self.base) + sum(1 for key in self.added if key not in self.base)
+
+
+def appendable(sequence):
+    """
+    Return `sequence` if it can be appended to, or else an
+    AppendableSequence over it.
+    """
+    if isinstance(sequence, (list, AppendableSequence)):
+        return sequence
+    return AppendableSequence(sequence)
+
+
+def writable(mapping):
+    """
+    Return `mapping` if items can be set in it, or else an
+    OverlayMapping over it.
+    """
+    if isinstance(mapping, (dict, OverlayMapping)):
+        return mapping
+    return OverlayMapping(mapping)
+
+
+class SortedIndex(Mapping):
+    """
+    Maps strings to integers by binary search over a sorted StringTable
+    of `keys`, where `values[i]` belongs to `keys[i]`.
+    """
+    def __init__(self, keys, values):
+        self.keys_table = keys
+        self.values_array = values
+
+    @classmethod
+    def from_sequence(cls, strings):
+        """
+        Index each string in `strings` by its position.
+        """
+        order = sorted(range(len(strings)), key=strings.__getitem__)
+        keys = StringTable.from_strings(strings[i] for i in order)
+        return cls(keys, array("i", order))
+
+    def __getitem__(self, key):
+        i = bisect_left(self.keys_table, key)
+        if i < len(self.keys_table) and self.keys_table[i] == key:
+            return self.values_array[i]
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.keys_table)
+
+    def __len__(self):
+        return len(self.keys_table)
+
+
+class NameIndex(Mapping):
+    """
+    Maps lowercase names to the set of person_ids with that name, like
+    the `names` dictionary built by `load_data`, by binary search over a
+    sorted StringTable of (possibly repeated) lowercase names.
+
+    Because the names are sorted, every name starting with a prefix is
+    found with one binary search (see `prefix`). Names added later are
+    kept in a sorted list of (name, person) pairs alongside the table.
+    """
+    def __init__(self, keys, people, person_ids):
+        self.keys_table = keys
+        self.people_array = people
+        self.person_ids = person_ids
+        self.added = []
+
+    @classmethod
+    def from_names(cls, names, person_ids):
+        """
+        Index `names[i]`, lowercased, as a name of `person_ids[i]`.
+        """
+        lowered = [name.lower() for name in names]
+        order = sorted(range(len(lowered)), key=lowered.__getitem__)
+        keys = StringTable.from_strings(lowered[i] for i in order)
+        return cls(keys, array("i", order), person_ids)
+
+    def __getitem__(self, name):
+        person_ids = {person_id for _, person_id in self.entries(name, name)}
+        if len(person_ids) == 0:
+            raise KeyError(name)
+        return person_ids
+
+    def __iter__(self):
+        previous = None
+        for name, _ in self.entries():
+            if name != previous:
+                yield name
+            previous = name
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def add(self, name, person):
+        """
+        Index `name`, lowercased, as a name of person index `person`.
+        """
+        insort(self.added, (name.lower(), person))
+
+    def prefix(self, prefix):
+        """
+        Yields (lowercase name, person_id) pairs, in name order, for every
+        name starting with `prefix` (compared in lowercase).
+        """
+        prefix = prefix.lower()
+        for name, person_id in self.entries(prefix):
+            if not name.startswith(prefix):
+                return
+            yield name, person_id
+
+    def entries(self, start=None, end=None):
+        """
+        Yields (lowercase name, person_id) pairs in name order, from the
+        first name not below `start` up to the last name not above `end`.
+        """
+        table = self.keys_table
+        lo = 0 if start is None else bisect_left(table, start)
+        hi = len(table) if end is None else bisect_right(table, end, lo=lo)
+        base = ((table[i], self.people_array[i]) for i in range(lo, hi))
+
+        lo = 0 if start is None else bisect_left(self.added, (start,))
+        added = (entry for entry in self.added[lo:]
+                 if end is None or entry[0] <= end)
+
+        for name, person in heapq.merge(base, added):
+            if end is not None and name > end:
+                return
+            yield name, self.person_ids[person]
+
+
+class PeopleTable(Mapping):
+    """
+    Maps person_ids to a dictionary of: name, birth, movies (a set of
+    movie_ids), like the `people` dictionary built by `load_data`, but
+    builds each dictionary from columnar storage when it is looked up.
+    """
+    def __init__(self, graph, names, births):
+        self.graph = graph
+        self.names = appendable(names)
+        self.births = appendable(births)
+
+    def __getitem__(self, person_id):
+        person = self.graph.person_index[person_id]
+        return {
+            "name": self.names[person],
+            "birth": self.births[person],
+            "movies": {self.graph.movie_ids[movie]
+                       for movie in self.graph.movies_for_person(person)}
+        }
+
+    def __contains__(self, person_id):
+        # Mapping's default would build the whole dictionary
+        return person_id in self.graph.person_index
+
+    def __iter__(self):
+        return iter(self.graph.person_ids)
+
+    def __len__(self):
+        return self.graph.num_people()
+
+    def add(self, name, birth):
+        """
+        Store the name and birth of the person last added to the graph.
+        """
+        self.names.append(name)
+        self.births.append(birth)
+
+
+class MoviesTable(Mapping):
+    """
+    Maps movie_ids to a dictionary of: title, year, stars (a set of
+    person_ids), like the `movies` dictionary built by `load_data`, but
+    builds each dictionary from columnar storage when it is looked up.
+    """
+    def __init__(self, graph, titles, years):
+        self.graph = graph
+        self.titles = appendable(titles)
+        self.years = appendable(years)
+
+    def __getitem__(self, movie_id):
+        movie = self.graph.movie_index[movie_id]
+        return {
+            "title": self.titles[movie],
+            "year": self.years[movie],
+            "stars": {self.graph.person_ids[person]
+                      for person in self.graph.stars_for_movie(movie)}
+        }
+
+    def __contains__(self, movie_id):
+        # Mapping's default would build the whole dictionary
+        return movie_id in self.graph.movie_index
+
+    def __iter__(self):
+        return iter(self.graph.movie_ids)
+
+    def __len__(self):
+        return self.graph.num_movies()
+
+    def add(self, title, year):
+        """
+        Store the title and year of the movie last added to the graph.
+        """
+        self.titles.append(title)
+        self.years.append(year)
@@ -1,3 +1,7 @@
+import heapq
+from collections import Counter, deque
+
+
 class Node():
     def __init__(self, state, parent, action):
         self.state = state
@@ -36,3 +40,77 @@ class QueueFrontier(StackFrontier):
             node = self.frontier[0]
             self.frontier = self.frontier[1:]
             return node
+
+
+class IndexedStackFrontier():
+    """
+    StackFrontier backed by a deque, with a count of the states it holds
+    so that `contains_state` and `remove` take constant time.
+    """
+    def __init__(self):
+        self.frontier = deque()
+        self.states = Counter()
+
+    def add(self, node):
+        self.frontier.append(node)
+        self.states[node.state] += 1
+
+    def contains_state(self, state):
+        return state in self.states
+
+    def empty(self):
+        return len(self.frontier) == 0
+
+    def remove(self):
+        if self.empty():
+            raise Exception("empty frontier")
+        else:
+            node = self.pop()
+            self.states[node.state] -= 1
+            if self.states[node.state] == 0:
+                del self.states[node.state]
+            return node
+
+    def pop(self):
+        return self.frontier.pop()
+
+
+class IndexedQueueFrontier(IndexedStackFrontier):
+
+    def pop(self):
+        return self.frontier.popleft()
+
+
+class PriorityFrontier():
+    """
+    Frontier that removes the node with the lowest priority first.
+
+    A state may be added again with a better priority; the stale entry
+    is skipped when it reaches the front.
+    """
+    def __init__(self):
+        self.frontier = []
+        self.priorities = {}
+        self.count = 0
+
+    def add(self, node, priority):
+        if priority >= self.priorities.get(node.state, float("inf")):
+            return
+        self.priorities[node.state] = priority
+        self.count += 1
+        heapq.heappush(self.frontier, (priority, self.count, node))
+
+    def contains_state(self, state):
+        return state in self.priorities
+
+    def empty(self):
+        return len(self.priorities) == 0
+
+    def remove(self):
+        if self.empty():
+            raise Exception("empty frontier")
+        while True:
+            priority, _, node = heapq.heappop(self.frontier)
+            if self.priorities.get(node.state) == priority:
+                del self.priorities[node.state]
+                return node
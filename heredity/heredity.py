@@ -1,7 +1,14 @@
+import argparse
 import csv
+import hashlib
 import itertools
+import json
+import multiprocessing
+import os
 import sys
 
+import inference
+
 PROBS = {
 
     # Unconditional probabilities for having gene
@@ -39,26 +46,237 @@ PROBS = {
 
 def main():
 
-    # Check for proper usage
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
-    people = load_data(sys.argv[1])
+    parser = argparse.ArgumentParser(usage="python heredity.py data.csv")
+    parser.add_argument("data", nargs="?")
+    parser.add_argument("--engine",
+                        choices=["enumerate", "stream", "sharded", "vectorized", "elimination"],
+                        default="enumerate",
+                        help="enumerate every possible world, generate only the worlds "
+                             "that agree with the known traits one at a time (in one "
+                             "process, or sharded across many), enumerate worlds in "
+                             "batches of arrays, or run exact inference by variable "
+                             "elimination")
+    parser.add_argument("--workers", type=int,
+                        help="processes for the sharded engine, or for batch mode "
+                             "(default: one per core)")
+    parser.add_argument("--batch", metavar="PATH",
+                        help="compute every family CSV in the directory PATH, or listed "
+                             "one per line in the manifest file PATH ('-' for stdin)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl",
+                        help="output format of batch mode")
+    parser.add_argument("--output", metavar="FILE",
+                        help="write batch results to FILE instead of stdout")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="recompute every family in batch mode, ignoring cached results")
+    args = parser.parse_args()
+
+    if args.batch is not None:
+        cache = None if args.no_cache else cache_path(args.batch)
+        out = sys.stdout if args.output is None else open(args.output, "w", newline="")
+        try:
+            run_batch(batch_files(args.batch), out, args.format, args.engine,
+                      args.workers, cache)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        return
+
+    if args.data is None:
+        parser.error("the data file is required unless --batch is given")
+    people = load_data(args.data)
+    probabilities = compute_probabilities(people, args.engine, args.workers)
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                print(f"    {value}: {p:.4f}")
+
+
+def compute_probabilities(people, engine="enumerate", workers=None):
+    """
+    Return every person's normalized gene and trait distributions, as
+    computed by `engine` (see `main`).
+    """
+    if engine == "elimination":
+        return inference.elimination_probabilities(people, PROBS)
+    elif engine == "stream":
+        return stream_probabilities(people)
+    elif engine == "sharded":
+        return sharded_probabilities(people, workers)
+    elif engine == "vectorized":
+        # Imported here so the other engines run without NumPy installed
+        import vectorized
+        return vectorized.vectorized_probabilities(people, PROBS)
+    return enumerate_probabilities(people)
+
+
+def batch_files(path):
+    """
+    Yield the family CSV files of a batch: every .csv file in `path`
+    if it is a directory, or else every line of the manifest file `path`
+    ('-' for stdin), skipping blank lines and lines starting with '#'.
+    Relative paths in a manifest file are relative to its directory.
+    """
+    if os.path.isdir(path):
+        for filename in sorted(os.listdir(path)):
+            if filename.endswith(".csv"):
+                yield os.path.join(path, filename)
+        return
+
+    f = sys.stdin if path == "-" else open(path)
+    directory = "." if path == "-" else os.path.dirname(path)
+    try:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield os.path.join(directory, line)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def cache_path(batch):
+    """
+    Return the directory caching the results of the batch `batch`: inside
+    it for a directory, and beside it for a manifest file.
+    """
+    if os.path.isdir(batch):
+        return os.path.join(batch, ".marginals")
+    return os.path.join("." if batch == "-" else os.path.dirname(batch), ".marginals")
+
+
+def run_batch(filenames, out, output_format="jsonl", engine="enumerate", workers=None,
+              cache=None):
+    """
+    Compute every family in `filenames` and write the results to `out` in
+    input order, as one JSON object per family, or as CSV with one row
+    per person.
+
+    Families are fanned out over a pool of `workers` processes (default:
+    one per core), and in order in this process if `workers` is 1. With
+    a `cache` directory, results are stored there under a hash of the
+    file's contents and of PROBS, and a family already computed is read
+    back instead of computed again.
+    """
+    tasks = ((filename, engine, cache) for filename in filenames)
+    if workers == 1:
+        write_batch(map(family_result, tasks), out, output_format)
+        return
+
+    with multiprocessing.Pool(workers) as pool:
+        write_batch(pool.imap(family_result, tasks, chunksize=4), out, output_format)
+
+
+def write_batch(results, out, output_format):
+    if output_format == "jsonl":
+        for result in results:
+            out.write(json.dumps(result) + "\n")
+        return
+
+    writer = csv.writer(out)
+    writer.writerow(["file", "name", "gene_2", "gene_1", "gene_0",
+                     "trait_true", "trait_false", "error"])
+    for result in results:
+        if "error" in result:
+            writer.writerow([result["file"], "", "", "", "", "", "", result["error"]])
+            continue
+        for name, person in result["people"].items():
+            writer.writerow([result["file"], name,
+                             person["gene"]["2"], person["gene"]["1"], person["gene"]["0"],
+                             person["trait"]["true"], person["trait"]["false"], ""])
+
+
+def family_result(task):
+    """
+    run_batch helper function
+
+    Returns a JSON-serializable result for one family file, holding each
+    person's distributions with their keys as strings, or an error.
+    """
+    filename, engine, cache = task
+    result = {"file": filename}
+    try:
+        with open(filename, "rb") as f:
+            key = hashlib.sha256(repr(PROBS).encode() + f.read()).hexdigest()
+    except OSError as error:
+        result["error"] = str(error)
+        return result
+    result["hash"] = key
+
+    cached = None if cache is None else os.path.join(cache, f"{key}.json")
+    if cached is not None:
+        people = read_cached(cached)
+        if people is not None:
+            result["people"] = people
+            result["cached"] = True
+            return result
+
+    try:
+        people = load_data(filename)
+        # Pool workers cannot start pools of their own
+        probabilities = compute_probabilities(people, engine, workers=1)
+    except (KeyError, ValueError, ZeroDivisionError, csv.Error) as error:
+        result["error"] = f"{type(error).__name__}: {error}"
+        return result
+    result["people"] = json.loads(json.dumps(probabilities))
+    result["cached"] = False
+
+    if cached is not None:
+        try:
+            write_cached(cached, result["people"])
+        except OSError:
+            # The cache only saves work, so carry on without it
+            pass
+    return result
+
+
+def read_cached(path):
+    """
+    family_result helper function
+
+    Returns the distributions cached at `path`, or None if there are
+    none or they cannot be read.
+    """
+    try:
+        with open(path) as f:
+            people = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return people if isinstance(people, dict) else None
+
+
+def write_cached(path, people):
+    """
+    family_result helper function
+
+    Stores the distributions `people` at `path`, writing them to a
+    staging file first so that no reader sees a partial file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    staging = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(staging, "w") as f:
+            json.dump(people, f)
+        os.replace(staging, path)
+    except OSError:
+        if os.path.exists(staging):
+            os.remove(staging)
+        raise
+
+
+def enumerate_probabilities(people):
+    """
+    Return the gene and trait probability distributions of every person,
+    by adding up the joint probability of every possible world that
+    agrees with the known traits.
+    """
 
     # Keep track of gene and trait probabilities for each person
-    probabilities = {
-        person: {
-            "gene": {
-                2: 0,
-                1: 0,
-                0: 0
-            },
-            "trait": {
-                True: 0,
-                False: 0
-            }
-        }
-        for person in people
-    }
+    probabilities = empty_probabilities(people)
 
     # Loop over all sets of people who might have the trait
     names = set(people)
@@ -83,15 +301,269 @@ def main():
 
     # Ensure probabilities sum to 1
     normalize(probabilities)
+    return probabilities
 
-    # Print results
+
+def stream_probabilities(people):
+    """
+    Return the same gene and trait probability distributions as
+    `enumerate_probabilities`, from the same worlds as `iter_worlds`.
+    """
+    probabilities = empty_probabilities(people)
+    add_worlds(people, probabilities)
+    normalize(probabilities)
+    return probabilities
+
+
+def sharded_probabilities(people, workers=None):
+    """
+    Return the same gene and trait probability distributions as
+    `stream_probabilities`, splitting the worlds into shards that are
+    added up on a pool of `workers` processes (default: one per core).
+
+    A shard is every world that starts with one choice of gene count and
+    trait for each of the first few people in `parents_first` order.
+    Each worker returns its own unnormalized distributions, which are
+    merged before they are normalized.
+    """
+    workers = workers or multiprocessing.cpu_count()
+    order = parents_first(people)
+
+    # Fix enough people that there are a few shards for every worker
+    shards = [()]
+    for person in order:
+        if len(shards) >= 4 * workers:
+            break
+        traits = (True, False) if people[person]["trait"] is None else (people[person]["trait"],)
+        shards = [shard + ((genes, trait),)
+                  for shard in shards for genes in (2, 1, 0) for trait in traits]
+
+    probabilities = empty_probabilities(people)
+    tasks = ((people, shard) for shard in shards)
+    if workers == 1:
+        for shard in map(shard_probabilities, tasks):
+            merge_probabilities(probabilities, shard)
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            for shard in pool.imap_unordered(shard_probabilities, tasks):
+                merge_probabilities(probabilities, shard)
+    normalize(probabilities)
+    return probabilities
+
+
+def shard_probabilities(task):
+    """
+    sharded_probabilities helper function
+
+    Returns the unnormalized distributions of the worlds in one shard.
+    """
+    people, shard = task
+    probabilities = empty_probabilities(people)
+    add_worlds(people, probabilities, shard)
+    return probabilities
+
+
+def merge_probabilities(probabilities, other):
+    """
+    Add every probability in `other` to the same one in `probabilities`.
+    """
+    for person, variables in other.items():
+        for variable, distribution in variables.items():
+            for value, p in distribution.items():
+                probabilities[person][variable][value] += p
+
+
+def add_worlds(people, probabilities, prefix=()):
+    """
+    Add the joint probability of every world from `iter_worlds` to
+    `probabilities` like `update`, or only the worlds in which the first
+    people in `parents_first` order have the (gene count, trait) pairs
+    in `prefix`.
+
+    Rather than adding each world to every person's distributions, the
+    partial worlds from `walk_worlds` are kept on a path, adding up the
+    probability of all the worlds below each one. Once every world below
+    a partial world has been seen, its total is added once to the
+    distributions of the partial world's last person.
+    """
+    order = parents_first(people)
+    last = len(order) - 1
+    gene_distributions = [probabilities[person]["gene"] for person in order]
+    trait_distributions = [probabilities[person]["trait"] for person in order]
+
+    # Gene count and trait of each person in the current partial world,
+    # and the total probability of the worlds found below it so far
+    genes = [0] * len(order)
+    traits = [False] * len(order)
+    totals = [0] * len(order)
+    depth = 0
+
+    def close(level):
+        # Add up the partial worlds deeper than `level`, which have no
+        # more worlds to come
+        nonlocal depth
+        while depth > level:
+            depth -= 1
+            total = totals[depth]
+            gene_distributions[depth][genes[depth]] += total
+            trait_distributions[depth][traits[depth]] += total
+            if depth:
+                totals[depth - 1] += total
+
+    for level, person_genes, person_trait, p in walk_worlds(people, order, prefix):
+        if depth > level:
+            close(level)
+        if level == last:
+            gene_distributions[level][person_genes] += p
+            trait_distributions[level][person_trait] += p
+            if level:
+                totals[level - 1] += p
+        else:
+            genes[level] = person_genes
+            traits[level] = person_trait
+            totals[level] = 0
+            depth = level + 1
+    close(0)
+
+
+def iter_worlds(people):
+    """
+    Yield (one_gene, two_genes, have_trait, p) for every possible world
+    that agrees with the known traits and has a joint probability `p`
+    above 0, as `joint_probability` would compute it.
+
+    Worlds are the complete partial worlds of `walk_worlds`, so only one
+    world is held at a time.
+    """
+    order = parents_first(people)
+    last = len(order) - 1
+    genes = [0] * len(order)
+    traits = [False] * len(order)
+    for level, person_genes, person_trait, p in walk_worlds(people, order):
+        genes[level] = person_genes
+        traits[level] = person_trait
+        if level == last:
+            yield (
+                {person for person, count in zip(order, genes) if count == 1},
+                {person for person, count in zip(order, genes) if count == 2},
+                {person for person, trait in zip(order, traits) if trait},
+                p,
+            )
+
+
+def walk_worlds(people, order, prefix=()):
+    """
+    Yield (level, gene count, trait, p) for every partial world that
+    agrees with the known traits and has a probability `p` above 0: the
+    first `level + 1` people in `order` (parents before children) have
+    been given a gene count and trait, the last of them the ones yielded.
+    With a `prefix` of (gene count, trait) pairs, only the partial worlds
+    that start with them are yielded.
+
+    Partial worlds are generated depth first, each followed by every
+    partial world that extends it. Known traits are fixed rather than
+    tried and discarded, each person's probability is multiplied in once
+    for all the worlds that share the people before them, and a partial
+    world with probability 0 is dropped along with every world that
+    extends it.
+    """
+    position = {person: i for i, person in enumerate(order)}
+    if not order:
+        return
+
+    last = len(order) - 1
+    genes = [0] * len(order)
+    partial = [1] * len(order)
+    options = [None] * len(order)
+    options[0] = iter(person_options(people, order[0], genes, position))
+    level = 0
+    while level >= 0:
+        for person_genes, person_trait, p in options[level]:
+            if level < len(prefix) and (person_genes, person_trait) != prefix[level]:
+                continue
+            p *= partial[level]
+            if p == 0:
+                continue
+            genes[level] = person_genes
+            yield level, person_genes, person_trait, p
+
+            if level < last:
+                # Go on to the partial worlds that extend this one
+                level += 1
+                partial[level] = p
+                options[level] = iter(person_options(people, order[level], genes, position))
+                break
+        else:
+            # Every partial world at this level has been tried
+            level -= 1
+
+
+def person_options(people, person, genes, position):
+    """
+    walk_worlds helper function
+
+    Returns a list of (gene count, trait, probability) for every gene
+    count and trait `person` can have given their parents' gene counts,
+    where `genes[position[name]]` is the gene count of `name`. A known
+    trait is the only trait tried, and a parent missing from the data
+    counts as having no copies, as in `joint_probability`.
+    """
+    parent_genes = [None if people[person][parent] is None
+                    else genes[position[people[person][parent]]]
+                    if people[person][parent] in position else 0
+                    for parent in ("mother", "father")]
+    trait = people[person]["trait"]
+    return [(person_genes, person_trait,
+             gene_probability(person_genes, *parent_genes)
+             * PROBS["trait"][person_genes][person_trait])
+            for person_genes in (2, 1, 0)
+            for person_trait in ((True, False) if trait is None else (trait,))]
+
+
+def parents_first(people):
+    """
+    Return the names of `people` ordered so that everyone comes after
+    their parents (those of them in `people`).
+    """
+    order = []
+    placed = set()
     for person in people:
-        print(f"{person}:")
-        for field in probabilities[person]:
-            print(f"  {field.capitalize()}:")
-            for value in probabilities[person][field]:
-                p = probabilities[person][field][value]
-                print(f"    {value}: {p:.4f}")
+        stack = [person]
+        while stack:
+            name = stack[-1]
+            if name in placed:
+                stack.pop()
+                continue
+            waiting = [parent for parent in (people[name]["mother"], people[name]["father"])
+                       if parent in people and parent not in placed]
+            if waiting:
+                stack.extend(waiting)
+            else:
+                placed.add(name)
+                order.append(name)
+                stack.pop()
+    return order
+
+
+def empty_probabilities(people):
+    """
+    Return gene and trait distributions for every person with every
+    probability 0, for `update` to add to.
+    """
+    return {
+        person: {
+            "gene": {
+                2: 0,
+                1: 0,
+                0: 0
+            },
+            "trait": {
+                True: 0,
+                False: 0
+            }
+        }
+        for person in people
+    }
 
 
 def load_data(filename):
@@ -213,6 +685,31 @@ def normalize(probabilities):
                 # Normalize the probability distribution by dividing the sum
                 variable[outcome] = probability / denominator
 
+def gene_probability(genes, mother_genes, father_genes):
+    """
+    walk_worlds helper function
+
+    Returns the probability of a person having `genes` copies of the gene,
+    given their parents' gene counts (both None if they have no parents),
+    with the same probabilities as `joint_probability`.
+    """
+    if mother_genes is None and father_genes is None:
+        return PROBS['gene'][genes]
+
+    mother_prob, father_prob = (
+        1 - PROBS['mutation'] if parent_genes == 2 else
+        0.5 if parent_genes == 1 else
+        PROBS['mutation']
+        for parent_genes in (mother_genes, father_genes)
+    )
+    if genes == 2:
+        return mother_prob * father_prob
+    elif genes == 1:
+        return (1 - mother_prob) * father_prob + (1 - father_prob) * mother_prob
+    else:
+        return (1 - mother_prob) * (1 - father_prob)
+
+
 def inherit_prob(parent_name, one_gene, two_genes):
     """
     joint_probability helper function
@@ -0,0 +1,227 @@
+import heapq
+import itertools
+
+# Values of every gene variable
+GENES = (0, 1, 2)
+
+
+class Factor():
+    """
+    Function from assignments of gene counts to `variables` (a tuple of
+    names) to non-negative numbers, stored in `table` as a dictionary
+    mapping each tuple of gene counts, in the order of `variables`, to
+    its value.
+    """
+    def __init__(self, variables, table):
+        self.variables = variables
+        self.table = table
+
+    def marginal(self, variables):
+        """
+        Return a Factor over `variables` (a subset of this factor's),
+        summing out every other variable.
+        """
+        positions = [self.variables.index(variable) for variable in variables]
+        table = {}
+        for assignment, value in self.table.items():
+            key = tuple(assignment[position] for position in positions)
+            table[key] = table.get(key, 0) + value
+        return Factor(tuple(variables), table)
+
+    def normalized(self):
+        """
+        Return this factor scaled to sum to 1, which leaves every
+        normalized probability computed from it the same, but keeps
+        products over large families from underflowing.
+        """
+        total = sum(self.table.values())
+        return Factor(self.variables, {key: value / total for key, value in self.table.items()})
+
+
+def multiply(factors):
+    """
+    Return the product of a list of factors, as a Factor over every
+    variable in any of them.
+    """
+    variables = []
+    for factor in factors:
+        for variable in factor.variables:
+            if variable not in variables:
+                variables.append(variable)
+
+    positions = [[variables.index(variable) for variable in factor.variables]
+                 for factor in factors]
+    table = {}
+    for assignment in itertools.product(GENES, repeat=len(variables)):
+        value = 1
+        for factor, factor_positions in zip(factors, positions):
+            value *= factor.table[tuple(assignment[position] for position in factor_positions)]
+            if value == 0:
+                break
+        table[assignment] = value
+    return Factor(tuple(variables), table)
+
+
+def person_factor(people, person, probs):
+    """
+    Return the Factor of `person`'s gene count given their parents' gene
+    counts, times the probability of their trait if it is known, with the
+    probabilities in `probs` (laid out like `heredity.PROBS`).
+    """
+    trait = people[person]["trait"]
+    named = [parent for parent in (people[person]["mother"], people[person]["father"])
+             if parent is not None]
+    parents = [parent for parent in named if parent in people]
+
+    table = {}
+    for assignment in itertools.product(GENES, repeat=1 + len(parents)):
+        genes = assignment[0]
+        if not named:
+            value = probs["gene"][genes]
+        else:
+            # A parent missing from the data passes on the gene like one
+            # without it, so only the parents in the data are variables
+            passes = [0.5 if parent_genes == 1 else
+                      1 - probs["mutation"] if parent_genes == 2 else
+                      probs["mutation"]
+                      for parent_genes in assignment[1:]]
+            passes += [probs["mutation"]] * (2 - len(passes))
+            mother, father = passes
+            if genes == 2:
+                value = mother * father
+            elif genes == 1:
+                value = (1 - mother) * father + (1 - father) * mother
+            else:
+                value = (1 - mother) * (1 - father)
+        if trait is not None:
+            value *= probs["trait"][genes][trait]
+        table[assignment] = value
+
+    return Factor((person, *parents), table)
+
+
+def elimination_order(factors):
+    """
+    Return an order in which to eliminate the variables of `factors`,
+    picking greedily the variable whose elimination adds the fewest new
+    edges between its neighbors (min-fill), then the one with the fewest
+    neighbors, so the cliques formed stay small.
+    """
+    neighbors = {}
+    for factor in factors:
+        for variable in factor.variables:
+            neighbors.setdefault(variable, set()).update(factor.variables)
+            neighbors[variable].discard(variable)
+
+    def cost(variable):
+        adjacent = list(neighbors[variable])
+        fill = sum(1 for a, b in itertools.combinations(adjacent, 2)
+                   if b not in neighbors[a])
+        return (fill, len(adjacent))
+
+    # Heap of (cost, variable), skipping entries whose cost is out of date
+    costs = {variable: cost(variable) for variable in neighbors}
+    heap = [(variable_cost, variable) for variable, variable_cost in costs.items()]
+    heapq.heapify(heap)
+
+    order = []
+    while heap:
+        variable_cost, variable = heapq.heappop(heap)
+        if costs.get(variable) != variable_cost:
+            continue
+        del costs[variable]
+        adjacent = neighbors.pop(variable)
+        for neighbor in adjacent:
+            neighbors[neighbor].discard(variable)
+            neighbors[neighbor].update(adjacent - {neighbor})
+        order.append(variable)
+
+        # Only the costs of variables next to the new edges can change
+        changed = set(adjacent)
+        for neighbor in adjacent:
+            changed.update(neighbors[neighbor])
+        for other in changed:
+            costs[other] = cost(other)
+            heapq.heappush(heap, (costs[other], other))
+    return order
+
+
+def elimination_probabilities(people, probs):
+    """
+    Return the same normalized gene and trait probabilities for every
+    person as enumerating every possible world with the probabilities in
+    `probs` (laid out like `heredity.PROBS`), computed exactly by
+    junction tree message passing, in time linear in the number of people
+    for families without marriages between relatives.
+
+    Eliminating the people's gene variables in `elimination_order` forms
+    a tree of cliques, one per person: each clique's message, with its
+    person summed out, goes to the clique of the first variable of the
+    message to be eliminated. Passing messages up this tree, and then
+    back down, gives every clique the distribution of its variables.
+    """
+    factors = [person_factor(people, person, probs) for person in people]
+    order = elimination_order(factors)
+    step = {variable: i for i, variable in enumerate(order)}
+
+    # Each factor belongs to the clique of its first variable eliminated
+    potentials = [[] for _ in order]
+    for factor in factors:
+        potentials[min(step[variable] for variable in factor.variables)].append(factor)
+
+    # Upward pass: eliminate each variable in turn, sending a message to
+    # the clique where the message's first remaining variable goes
+    parent = [None] * len(order)
+    upward = [None] * len(order)
+    incoming = [[] for _ in order]
+    for i, variable in enumerate(order):
+        product = multiply(potentials[i] + [upward[child] for child in incoming[i]])
+        separator = tuple(v for v in product.variables if v != variable)
+        upward[i] = product.marginal(separator).normalized()
+        if separator:
+            parent[i] = min(step[v] for v in separator)
+            incoming[parent[i]].append(i)
+
+    # Downward pass: from the roots, each clique sends its children the
+    # product of everything else it has received
+    downward = [None] * len(order)
+    probabilities = {}
+    for i in reversed(range(len(order))):
+        messages = [upward[child] for child in incoming[i]]
+        if parent[i] is not None:
+            messages.append(downward[i])
+        for child in incoming[i]:
+            # The separator may hold variables that only the child's message has
+            separator = upward[child].variables
+            ones = Factor(separator, dict.fromkeys(
+                itertools.product(GENES, repeat=len(separator)), 1))
+            others = [message for message in messages if message is not upward[child]]
+            downward[child] = multiply(potentials[i] + others + [ones]).marginal(
+                separator).normalized()
+        belief = multiply(potentials[i] + messages).marginal((order[i],))
+        probabilities[order[i]] = belief
+
+    return gene_and_trait_probabilities(people, probabilities, probs)
+
+
+def gene_and_trait_probabilities(people, beliefs, probs):
+    """
+    Return normalized gene and trait probabilities in the format of
+    `heredity.main` from each person's (unnormalized) gene Factor.
+    """
+    probabilities = {}
+    for person in people:
+        table = beliefs[person].table
+        total = sum(table.values())
+        gene = {genes: table[(genes,)] / total for genes in (2, 1, 0)}
+
+        trait = people[person]["trait"]
+        if trait is not None:
+            has_trait = 1.0 if trait else 0.0
+        else:
+            has_trait = sum(gene[genes] * probs["trait"][genes][True] for genes in gene)
+        probabilities[person] = {
+            "gene": gene,
+            "trait": {True: has_trait, False: 1 - has_trait},
+        }
+    return probabilities
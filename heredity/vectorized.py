@@ -0,0 +1,139 @@
+import numpy as np
+
+# Worlds whose joint probabilities are computed at once
+BATCH_SIZE = 1 << 14
+
+
+class Family():
+    """
+    A family from `load_data` encoded as arrays, with people numbered by
+    their position in `names`: `mothers[i]` and `fathers[i]` are the
+    numbers of person `i`'s parents (-1 if not in the data),
+    `has_parents[i]` is True if the data names either parent, and
+    `traits[i]` is 1 or 0 if their trait is known and -1 otherwise.
+
+    Worlds are described by integer arrays of shape (worlds, people):
+    `genes[w, i]` is person `i`'s gene count in world `w`, and
+    `traits[w, i]` is 1 if they have the trait in world `w`.
+    """
+    def __init__(self, people, probs):
+        self.names = list(people)
+        index = {name: i for i, name in enumerate(self.names)}
+        self.mothers = np.array([index.get(people[name]["mother"], -1)
+                                 for name in self.names], dtype=np.int64)
+        self.fathers = np.array([index.get(people[name]["father"], -1)
+                                 for name in self.names], dtype=np.int64)
+        self.traits = np.array([-1 if people[name]["trait"] is None else int(people[name]["trait"])
+                                for name in self.names], dtype=np.int64)
+        self.has_parents = np.array([people[name]["mother"] is not None
+                                     or people[name]["father"] is not None
+                                     for name in self.names], dtype=bool)
+        self.gene_table, self.inherit_table, self.trait_table = lookup_tables(probs)
+
+
+def lookup_tables(probs):
+    """
+    Return arrays of the probabilities in `probs` (laid out like
+    `heredity.PROBS`), indexed by gene counts and traits:
+        * gene_table[g]: probability of `g` copies for someone without parents.
+        * inherit_table[m, f, g]: probability of `g` copies for a child of
+          parents with `m` and `f` copies.
+        * trait_table[g, t]: probability of trait `t` (0 or 1) with `g` copies.
+    """
+    gene_table = np.array([probs["gene"][genes] for genes in range(3)])
+    trait_table = np.array([[probs["trait"][genes][False], probs["trait"][genes][True]]
+                            for genes in range(3)])
+
+    # Probability of passing the gene on, for a parent with each gene count
+    passes = np.array([probs["mutation"], 0.5, 1 - probs["mutation"]])
+    mother, father = passes[:, None], passes[None, :]
+    inherit_table = np.stack([
+        (1 - mother) * (1 - father),
+        (1 - mother) * father + (1 - father) * mother,
+        mother * father,
+    ], axis=-1)
+    return gene_table, inherit_table, trait_table
+
+
+def joint_probabilities(family, genes, traits):
+    """
+    Return an array of the joint probability of every world described by
+    the (worlds, people) arrays `genes` and `traits`, each computed as
+    `joint_probability` would.
+    """
+    # A parent missing from the data passes on the gene like one without it
+    padded = np.concatenate([genes, np.zeros((len(genes), 1), dtype=genes.dtype)], axis=1)
+    inherited = family.inherit_table[padded[:, family.mothers], padded[:, family.fathers], genes]
+    person = np.where(family.has_parents, inherited, family.gene_table[genes])
+    person *= family.trait_table[genes, traits]
+    return person.prod(axis=1)
+
+
+def add_marginals(gene_totals, trait_totals, genes, traits, p):
+    """
+    Add the joint probabilities `p` of a batch of worlds to the
+    (people, 3) array `gene_totals` and the (people, 2) array
+    `trait_totals`, like `update` does for one world.
+    """
+    num_people = genes.shape[1]
+    weights = np.broadcast_to(p[:, None], genes.shape).ravel()
+    person = np.arange(num_people)
+    gene_totals += np.bincount((person * 3 + genes).ravel(), weights=weights,
+                               minlength=num_people * 3).reshape(num_people, 3)
+    trait_totals += np.bincount((person * 2 + traits).ravel(), weights=weights,
+                                minlength=num_people * 2).reshape(num_people, 2)
+
+
+def iter_world_batches(family, batch_size=BATCH_SIZE):
+    """
+    Yield (genes, traits) arrays for every possible world that agrees
+    with the family's known traits, `batch_size` worlds at a time.
+
+    World number `w` is decoded in a mixed radix: one base-3 digit for
+    each person's gene count, then one bit for each unknown trait.
+    """
+    num_people = len(family.names)
+    unknown = np.flatnonzero(family.traits < 0)
+    gene_places = 3 ** np.arange(num_people, dtype=np.int64)
+    trait_places = 2 ** np.arange(len(unknown), dtype=np.int64)
+    num_worlds = 3 ** num_people * 2 ** len(unknown)
+
+    for start in range(0, num_worlds, batch_size):
+        worlds = np.arange(start, min(start + batch_size, num_worlds), dtype=np.int64)
+        genes = (worlds[:, None] // gene_places) % 3
+        traits = np.broadcast_to(family.traits, (len(worlds), num_people)).copy()
+        traits[:, unknown] = (worlds[:, None] // 3 ** num_people // trait_places) % 2
+        yield genes, traits
+
+
+def vectorized_probabilities(people, probs, batch_size=BATCH_SIZE):
+    """
+    Return the same gene and trait probability distributions as
+    `heredity.enumerate_probabilities` with the probabilities in `probs`,
+    computing the joint probabilities of `batch_size` worlds at a time
+    with array lookups, and adding them to everyone's distributions with
+    array sums.
+    """
+    family = Family(people, probs)
+    gene_totals = np.zeros((len(family.names), 3))
+    trait_totals = np.zeros((len(family.names), 2))
+    for genes, traits in iter_world_batches(family, batch_size):
+        p = joint_probabilities(family, genes, traits)
+        add_marginals(gene_totals, trait_totals, genes, traits, p)
+    return marginals_dict(family, gene_totals, trait_totals)
+
+
+def marginals_dict(family, gene_totals, trait_totals):
+    """
+    Return normalized gene and trait probabilities in the format of
+    `heredity.main` from the totals of `add_marginals`.
+    """
+    gene_totals = gene_totals / gene_totals.sum(axis=1, keepdims=True)
+    trait_totals = trait_totals / trait_totals.sum(axis=1, keepdims=True)
+    return {
+        name: {
+            "gene": {genes: float(gene_totals[i, genes]) for genes in (2, 1, 0)},
+            "trait": {True: float(trait_totals[i, 1]), False: float(trait_totals[i, 0])},
+        }
+        for i, name in enumerate(family.names)
+    }
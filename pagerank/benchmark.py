@@ -0,0 +1,253 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import pagerank
+from linkgraph import LinkGraph, iterate_ranks
+
+MODELS = ["erdos-renyi", "preferential", "dangling"]
+
+CRAWLERS = [pagerank.crawl, pagerank.stream_crawl]
+
+SAMPLERS = [pagerank.sample_pagerank, pagerank.fast_sample_pagerank]
+
+ITERATORS = [pagerank.iterate_pagerank, pagerank.sparse_pagerank]
+
+# Functions that loop over every pair of pages, too slow for large corpora
+SLOW = [pagerank.sample_pagerank, pagerank.iterate_pagerank]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks for the PageRank code.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser(
+        "generate", help="write a synthetic corpus of HTML pages")
+    generate.add_argument("directory")
+    generate.add_argument("--model", choices=MODELS, default="erdos-renyi")
+    add_graph_arguments(generate)
+
+    run = commands.add_parser(
+        "run", help="time crawling, sampling and iterating over corpora")
+    run.add_argument("directory", nargs="?",
+                     help="corpus to benchmark (default: one generated corpus per model)")
+    run.add_argument("--model", choices=MODELS + ["all"], default="all",
+                     help="model of the generated corpora")
+    add_graph_arguments(run)
+    run.add_argument("--samples", type=int, default=pagerank.SAMPLES)
+    run.add_argument("--fast-only", action="store_true",
+                     help="skip the functions that loop over every pair of pages")
+    run.add_argument("--json", metavar="FILE",
+                     help="also write the results to FILE as JSON")
+
+    args = parser.parse_args()
+    if args.command == "generate":
+        graph = generate_graph(args.model, args.pages, args.degree, args.dangling, args.seed)
+        write_corpus(args.directory, graph)
+        return
+
+    if args.directory is not None:
+        results = [benchmark_corpus(args.directory, args.directory, args.samples,
+                                    args.fast_only)]
+    else:
+        results = []
+        models = MODELS if args.model == "all" else [args.model]
+        for model in models:
+            graph = generate_graph(model, args.pages, args.degree, args.dangling, args.seed)
+            with tempfile.TemporaryDirectory() as directory:
+                write_corpus(directory, graph)
+                results.append(benchmark_corpus(model, directory, args.samples,
+                                                args.fast_only))
+    for result in results:
+        print_results(result)
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+def add_graph_arguments(parser):
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--degree", type=float, default=8,
+                        help="average number of links per page")
+    parser.add_argument("--dangling", type=float, default=0.5,
+                        help="fraction of pages without links in the dangling model")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def generate_graph(model, num_pages, degree, dangling, seed):
+    """
+    Return a random LinkGraph of `num_pages` pages with about `degree`
+    links per page, from one of the MODELS:
+        * "erdos-renyi": every page links to each other page with the
+          same probability.
+        * "preferential": pages are added one at a time, each linking to
+          earlier pages picked in proportion to their links so far, so a
+          few pages collect most of the links, as on the web.
+        * "dangling": like "erdos-renyi", but with a `dangling` fraction
+          of the pages having no links.
+
+    The same arguments always produce the same graph.
+    """
+    rng = np.random.default_rng(seed)
+    pages = [f"page{i}.html" for i in range(num_pages)]
+
+    if model == "preferential":
+        sources, targets = preferential_links(num_pages, max(int(round(degree)), 1), rng)
+    else:
+        # Pick each page's number of links, then that many other pages
+        probability = min(degree / max(num_pages - 1, 1), 1)
+        counts = rng.binomial(max(num_pages - 1, 0), probability, size=num_pages)
+        if model == "dangling":
+            counts[rng.random(num_pages) < dangling] = 0
+        sources = np.repeat(np.arange(num_pages), counts)
+        targets = rng.integers(0, max(num_pages - 1, 1), size=len(sources))
+        targets += targets >= sources
+
+    return LinkGraph.from_edges(pages, sources, targets)
+
+
+def preferential_links(num_pages, degree, rng):
+    """
+    Return (sources, targets) of a directed preferential attachment graph
+    in which every page links to `degree` earlier pages.
+    """
+    sources, targets = [], []
+
+    # Every page appears once, plus once per link to it, so picking
+    # uniformly from `endpoints` picks pages in proportion to links + 1
+    endpoints = []
+    for page in range(num_pages):
+        if page > 0:
+            chosen = set()
+            for _ in range(min(degree, page)):
+                chosen.add(endpoints[int(rng.integers(len(endpoints)))])
+            for target in chosen:
+                sources.append(page)
+                targets.append(target)
+            endpoints.extend(chosen)
+        endpoints.append(page)
+    return np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64)
+
+
+def write_corpus(directory, graph):
+    """
+    Write every page of `graph` to `directory` as an HTML file with a
+    link to each of the pages it links to.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for i, page in enumerate(graph.pages):
+        links = "\n".join(f'    <a href="{graph.pages[link]}">{graph.pages[link]}</a>'
+                          for link in graph.links(i))
+        with open(os.path.join(directory, page), "w") as f:
+            f.write(f"<html>\n  <body>\n{links}\n  </body>\n</html>\n")
+
+
+def measure(function, *args):
+    """
+    Call `function` twice, and return its result along with the seconds
+    taken by the first call and the peak memory allocated by the second,
+    which is traced with tracemalloc (in this process only).
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        function(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak
+
+
+def benchmark_corpus(name, directory, samples, fast_only):
+    """
+    Crawl the corpus in `directory` with every crawler, then rank it with
+    every sampler and iterator, and return their timings, throughput and
+    peak memory as a dictionary, along with how far each one's ranks are
+    from a reference solution iterated to a tolerance of 1e-12.
+    """
+    corpus = pagerank.crawl(directory)
+    graph = LinkGraph.from_corpus(corpus)
+    reference = iterate_ranks(graph, pagerank.DAMPING, tolerance=1e-12, norm="l1").ranks
+    results = {
+        "name": name,
+        "pages": graph.num_pages(),
+        "links": graph.num_links(),
+        "samples": samples,
+        "crawl": {},
+        "sample": {},
+        "iterate": {},
+    }
+
+    for crawler in CRAWLERS:
+        crawled, seconds, peak = measure(crawler, directory)
+        results["crawl"][crawler.__name__] = {
+            "seconds": seconds,
+            "peak_bytes": peak,
+            "pages_per_second": graph.num_pages() / seconds,
+            "matches": crawled == corpus,
+        }
+
+    for sampler in SAMPLERS:
+        if fast_only and sampler in SLOW:
+            continue
+        ranks, seconds, peak = measure(sampler, corpus, pagerank.DAMPING, samples)
+        results["sample"][sampler.__name__] = {
+            "seconds": seconds,
+            "peak_bytes": peak,
+            "samples_per_second": samples / seconds,
+            **errors(graph, ranks, reference),
+        }
+
+    for iterator in ITERATORS:
+        if fast_only and iterator in SLOW:
+            continue
+        ranks, seconds, peak = measure(iterator, corpus, pagerank.DAMPING)
+        results["iterate"][iterator.__name__] = {
+            "seconds": seconds,
+            "peak_bytes": peak,
+            "pages_per_second": graph.num_pages() / seconds,
+            **errors(graph, ranks, reference),
+        }
+
+    return results
+
+
+def errors(graph, ranks, reference):
+    """
+    Return the largest and total absolute difference between a ranks
+    dictionary and the reference rank vector of `graph`.
+    """
+    difference = np.abs(np.array([ranks[page] for page in graph.pages]) - reference)
+    return {"max_error": float(difference.max()), "l1_error": float(difference.sum())}
+
+
+def print_results(results):
+    print(f"{results['name']}: {results['pages']} pages, {results['links']} links")
+    for name, result in results["crawl"].items():
+        print(f"  {name}: {result['seconds'] * 1000:.1f}ms, "
+              f"{result['pages_per_second']:.0f} pages/s, "
+              f"peak {result['peak_bytes'] / 1024:.0f} KiB"
+              + ("" if result["matches"] else ", DIFFERS FROM crawl"))
+    for name, result in results["sample"].items():
+        print(f"  {name} (n = {results['samples']}): {result['seconds'] * 1000:.1f}ms, "
+              f"{result['samples_per_second']:.0f} samples/s, "
+              f"peak {result['peak_bytes'] / 1024:.0f} KiB, "
+              f"max error {result['max_error']:.4f}")
+    for name, result in results["iterate"].items():
+        print(f"  {name}: {result['seconds'] * 1000:.1f}ms, "
+              f"{result['pages_per_second']:.0f} pages/s, "
+              f"peak {result['peak_bytes'] / 1024:.0f} KiB, "
+              f"max error {result['max_error']:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import multiprocessing
+import os
+import re
+
+# Same link pattern as `crawl`
+LINK_PATTERN = re.compile(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
+
+# Unfinished text that can still grow into a LINK_PATTERN match:
+# a tag still in its attributes, or a tag inside its href value
+PARTIAL_PATTERNS = [
+    re.compile(r"<a(?:\s[^>]*)?"),
+    re.compile(r"<a\s+(?:[^>]*?)href=\"[^\"]*"),
+]
+
+CHUNK_SIZE = 1 << 20
+
+
+def iter_links(filename, chunk_size=CHUNK_SIZE):
+    """
+    Yield every link target in an HTML file, reading it `chunk_size`
+    characters at a time rather than all at once.
+
+    Text that may be the start of a link split across two chunks is
+    carried over and searched again with the next chunk.
+    """
+    with open(filename) as f:
+        carry = ""
+        while True:
+            chunk = f.read(chunk_size)
+            text = carry + chunk
+            end = 0
+            for match in LINK_PATTERN.finditer(text):
+                yield match.group(1)
+                end = match.end()
+            if not chunk:
+                return
+            carry = text[pending_start(text, end):]
+
+
+def pending_start(text, start):
+    """
+    Return the position of the first `<a` tag at or after `start` in
+    `text` that is unfinished but could still become a link, or the
+    length of `text` if there is none.
+    """
+    position = text.find("<a", start)
+    while position != -1:
+        if any(pattern.fullmatch(text, position) for pattern in PARTIAL_PATTERNS):
+            return position
+        position = text.find("<a", position + 1)
+    if text.endswith("<"):
+        return len(text) - 1
+    return len(text)
+
+
+def list_pages(directory):
+    """
+    Return the sorted names of the HTML pages in `directory`.
+    """
+    return sorted(filename for filename in os.listdir(directory)
+                  if filename.endswith(".html"))
+
+
+def crawl_edges(directory, workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield (page, link) pairs for every link between HTML pages in
+    `directory`, as each file is parsed.
+
+    Files are parsed in a pool of `workers` processes (default: one per
+    core), and in order in this process if `workers` is 1.
+    """
+    filenames = list_pages(directory)
+    pages = set(filenames)
+    for page, links in parse_files(directory, filenames, workers, chunk_size):
+        for link in sorted(links):
+            if link in pages and link != page:
+                yield page, link
+
+
+def parse_files(directory, filenames, workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield (filename, links) for each of `filenames` in `directory` as it
+    is parsed, where `links` is the set of every link target in the file.
+
+    Files are parsed in a pool of `workers` processes (default: one per
+    core), and in order in this process if `workers` is 1.
+    """
+    tasks = ((directory, filename, chunk_size) for filename in filenames)
+    if workers == 1:
+        yield from map(file_links, tasks)
+        return
+
+    with multiprocessing.Pool(workers) as pool:
+        yield from pool.imap_unordered(file_links, tasks, chunksize=16)
+
+
+def file_links(task):
+    """
+    parse_files helper function
+    """
+    directory, filename, chunk_size = task
+    return filename, set(iter_links(os.path.join(directory, filename), chunk_size))
@@ -0,0 +1,176 @@
+import os
+
+import numpy as np
+
+from crawler import CHUNK_SIZE, crawl_edges, list_pages
+from linkgraph import NORMS, IterationResult, PageGraph
+from linkstore import read_meta, staged_directory
+
+# Layout version of the edge list files, checked by read_meta
+VERSION = 1
+
+# Links read from disk at a time
+BLOCK_SIZE = 1 << 20
+
+
+class EdgeList(PageGraph):
+    """
+    Links of a corpus kept on disk and memory-mapped: link `e` goes from
+    page `sources[e]` to page `targets[e]`, with the links sorted by
+    target, so that the links into any range of pages are contiguous.
+
+    Only `pages` and `out_degree` are held per page; nothing is held
+    per link.
+    """
+    def __init__(self, path):
+        meta = read_meta(path, VERSION)
+        if meta is None:
+            raise ValueError(f"no edge list of version {VERSION} in {path}")
+        self.pages = meta["pages"]
+        self.sources = np.load(os.path.join(path, "sources.npy"), mmap_mode="r")
+        self.targets = np.load(os.path.join(path, "targets.npy"), mmap_mode="r")
+        self.out_degree = np.load(os.path.join(path, "out_degree.npy"))
+
+    def num_links(self):
+        return len(self.targets)
+
+
+def edge_list_path(directory):
+    """
+    Return the directory holding the on-disk edge list of `directory`.
+    """
+    return os.path.join(directory, ".edgelist")
+
+
+def compile_edge_list(directory, workers=None, chunk_size=CHUNK_SIZE, block_size=BLOCK_SIZE):
+    """
+    Parse the HTML pages in `directory` into an on-disk edge list and
+    return it as an EdgeList.
+
+    Links are written to disk as their files are parsed, `block_size` at
+    a time, so the corpus is never held in memory as a whole.
+    """
+    pages = list_pages(directory)
+    index = {page: i for i, page in enumerate(pages)}
+
+    def blocks():
+        sources, targets = [], []
+        for page, link in crawl_edges(directory, workers, chunk_size):
+            sources.append(index[page])
+            targets.append(index[link])
+            if len(sources) == block_size:
+                yield sources, targets
+                sources, targets = [], []
+        yield sources, targets
+
+    path = edge_list_path(directory)
+    write_edge_list(path, pages, blocks(), block_size)
+    return EdgeList(path)
+
+
+def write_edge_list(path, pages, blocks, block_size=BLOCK_SIZE):
+    """
+    Write an edge list over `pages` to the directory `path`, from an
+    iterable of (sources, targets) blocks of page indices. Links must
+    not repeat.
+
+    The links are first appended unsorted to a scratch file while the
+    links into each page are counted, then moved to their place in
+    target order `block_size` at a time: a counting sort that needs
+    memory per page but not per link.
+    """
+    num_pages = len(pages)
+    in_degree = np.zeros(num_pages, dtype=np.int64)
+    out_degree = np.zeros(num_pages, dtype=np.int64)
+    with staged_directory(path, VERSION, {"pages": pages}) as staging:
+        scratch = os.path.join(staging, "unsorted.bin")
+        with open(scratch, "wb") as f:
+            for sources, targets in blocks:
+                pairs = np.empty((len(sources), 2), dtype=np.int32)
+                pairs[:, 0] = sources
+                pairs[:, 1] = targets
+                in_degree += np.bincount(pairs[:, 1], minlength=num_pages)
+                out_degree += np.bincount(pairs[:, 0], minlength=num_pages)
+                f.write(pairs.tobytes())
+        num_links = int(in_degree.sum())
+
+        # Next free position among the links into each page
+        cursor = np.zeros(num_pages, dtype=np.int64)
+        np.cumsum(in_degree[:-1], out=cursor[1:])
+        sorted_sources = np.lib.format.open_memmap(
+            os.path.join(staging, "sources.npy"), mode="w+", dtype=np.int32, shape=(num_links,))
+        sorted_targets = np.lib.format.open_memmap(
+            os.path.join(staging, "targets.npy"), mode="w+", dtype=np.int32, shape=(num_links,))
+        if num_links:
+            unsorted = np.memmap(scratch, dtype=np.int32, mode="r", shape=(num_links, 2))
+            for start in range(0, num_links, block_size):
+                block = np.array(unsorted[start:start + block_size])
+                block = block[np.argsort(block[:, 1], kind="stable")]
+                targets, first, counts = np.unique(block[:, 1], return_index=True,
+                                                   return_counts=True)
+                rank_in_target = np.arange(len(block)) - np.repeat(first, counts)
+                positions = np.repeat(cursor[targets], counts) + rank_in_target
+                sorted_sources[positions] = block[:, 0]
+                sorted_targets[positions] = block[:, 1]
+                cursor[targets] += counts
+            del unsorted
+        sorted_sources.flush()
+        sorted_targets.flush()
+        del sorted_sources, sorted_targets
+        os.remove(scratch)
+
+        np.save(os.path.join(staging, "out_degree.npy"), out_degree)
+
+
+def stream_ranks(edges, damping_factor, tolerance=0.001, norm="inf",
+                 max_iterations=None, block_size=BLOCK_SIZE):
+    """
+    Iterate towards the PageRank vector of an EdgeList like
+    `iterate_ranks` with the "jacobi" method, and return an
+    IterationResult.
+
+    Every round streams the links from disk `block_size` at a time.
+    Since they are sorted by target, each block adds rank into one
+    contiguous range of pages, so only rank vectors are held in memory.
+    """
+    if norm not in NORMS:
+        raise ValueError(f"unknown norm {norm!r}")
+
+    num_pages = edges.num_pages()
+    num_links = edges.num_links()
+    dangling = edges.out_degree == 0
+    inverse_degree = np.zeros(num_pages)
+    inverse_degree[~dangling] = 1 / edges.out_degree[~dangling]
+    random_choice_prob = (1 - damping_factor) / num_pages
+
+    ranks = np.full(num_pages, 1 / num_pages)
+    new_ranks = np.empty(num_pages)
+    weighted = np.empty(num_pages)
+    change = np.empty(num_pages)
+
+    residuals = []
+    while max_iterations is None or len(residuals) < max_iterations:
+        # Rank flowing along links: each page splits its rank over its links
+        np.multiply(ranks, inverse_degree, out=weighted)
+        new_ranks.fill(0)
+        for start in range(0, num_links, block_size):
+            sources = edges.sources[start:start + block_size]
+            targets = edges.targets[start:start + block_size]
+            low, high = int(targets[0]), int(targets[-1]) + 1
+            new_ranks[low:high] += np.bincount(targets - low, weights=weighted[sources],
+                                               minlength=high - low)
+
+        # Rank of pages with no links goes to every page equally
+        new_ranks += ranks[dangling].sum() / num_pages
+        new_ranks *= damping_factor
+        new_ranks += random_choice_prob
+        new_ranks /= new_ranks.sum()
+
+        np.subtract(new_ranks, ranks, out=change)
+        np.abs(change, out=change)
+        residuals.append(float(change.max() if norm == "inf" else change.sum()))
+        ranks, new_ranks = new_ranks, ranks
+        if residuals[-1] <= tolerance:
+            return IterationResult(ranks, len(residuals), residuals, True)
+
+    return IterationResult(ranks, len(residuals), residuals, False)
@@ -0,0 +1,354 @@
+import multiprocessing
+import random
+from collections import namedtuple
+
+import numpy as np
+
+
+class PageGraph():
+    """
+    Base class for the link graphs of a corpus, with page names interned
+    to dense integers: their position in the list `pages`.
+    """
+    def num_pages(self):
+        return len(self.pages)
+
+    def ranks_dict(self, ranks):
+        """
+        Returns a dictionary mapping each page name to its value in
+        the array `ranks`.
+        """
+        return {page: float(rank) for page, rank in zip(self.pages, ranks)}
+
+
+class LinkGraph(PageGraph):
+    """
+    Link graph of a corpus, with page names interned to dense integers
+    (their position in `pages`) and links stored in compressed sparse
+    row form: the pages linked to by page `i` are
+    `indices[indptr[i]:indptr[i + 1]]`.
+
+    Only `out_degree` is computed per page on top of the CSR arrays, so a
+    graph memory-mapped from disk is not copied into memory per link.
+    """
+    def __init__(self, pages, indptr, indices):
+        self.pages = pages
+        self.indptr = indptr
+        self.indices = indices
+        self.index = {page: i for i, page in enumerate(pages)}
+        self.out_degree = np.diff(indptr)
+
+    @classmethod
+    def from_corpus(cls, corpus):
+        """
+        Build a graph from a corpus dictionary as returned by `crawl`.
+        """
+        pages = sorted(corpus)
+        index = {page: i for i, page in enumerate(pages)}
+        indptr = np.zeros(len(pages) + 1, dtype=np.int64)
+        indices = []
+        for i, page in enumerate(pages):
+            links = sorted(index[link] for link in corpus[page])
+            indices.extend(links)
+            indptr[i + 1] = len(indices)
+        return cls(pages, indptr, np.array(indices, dtype=np.int32))
+
+    @classmethod
+    def from_edges(cls, pages, sources, targets):
+        """
+        Build a graph over `pages` from arrays of link source and target
+        indices, dropping repeated links and links from a page to itself.
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        keep = sources != targets
+        keys = np.unique(sources[keep] * len(pages) + targets[keep])
+        sources, targets = np.divmod(keys, len(pages)) if len(pages) else (keys, keys)
+
+        indptr = np.zeros(len(pages) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(pages)), out=indptr[1:])
+        return cls(pages, indptr, targets.astype(np.int32))
+
+    def with_edits(self, added_pages=(), removed_pages=(), added_links=(), removed_links=()):
+        """
+        Return a new graph with `removed_pages` (and every link to or from
+        them) and `removed_links` taken out, then `added_pages` and
+        `added_links` put in. Links are (page, linked page) name pairs.
+
+        Raises ValueError for a link to or from a page not in the result.
+        """
+        removed_pages = set(removed_pages)
+        pages = sorted((set(self.pages) - removed_pages) | set(added_pages))
+        index = {page: i for i, page in enumerate(pages)}
+
+        # Renumber the existing links, dropping those of removed pages
+        renumber = np.array([index.get(page, -1) for page in self.pages], dtype=np.int64)
+        sources = renumber[self.link_sources()] if self.num_links() else np.zeros(0, dtype=np.int64)
+        targets = renumber[self.indices] if self.num_links() else np.zeros(0, dtype=np.int64)
+        keep = (sources >= 0) & (targets >= 0)
+        sources, targets = sources[keep], targets[keep]
+
+        def link_indices(links):
+            try:
+                pairs = [(index[page], index[link]) for page, link in links]
+            except KeyError as error:
+                raise ValueError(f"link to or from unknown page {error}")
+            return np.array(pairs, dtype=np.int64).reshape(-1, 2)
+
+        removed = link_indices(removed_links)
+        if len(removed):
+            removed_keys = removed[:, 0] * len(pages) + removed[:, 1]
+            keep = ~np.isin(sources * len(pages) + targets, removed_keys)
+            sources, targets = sources[keep], targets[keep]
+
+        added = link_indices(added_links)
+        sources = np.concatenate([sources, added[:, 0]])
+        targets = np.concatenate([targets, added[:, 1]])
+        return LinkGraph.from_edges(pages, sources, targets)
+
+    def num_links(self):
+        return len(self.indices)
+
+    def link_sources(self):
+        """
+        Returns an array of the page index each link starts from, so that
+        the links can be walked as (sources, indices) pairs without a loop.
+        """
+        return np.repeat(np.arange(self.num_pages(), dtype=np.int32), self.out_degree)
+
+    def links(self, page):
+        """
+        Returns the indices of the pages linked to by page index `page`.
+        """
+        return self.indices[self.indptr[page]:self.indptr[page + 1]]
+
+    def to_corpus(self):
+        """
+        Returns the graph as a corpus dictionary, as returned by `crawl`.
+        """
+        return {page: {self.pages[link] for link in self.links(i)}
+                for i, page in enumerate(self.pages)}
+
+
+# Result of iterate_ranks: the rank vector, the number of rounds run,
+# the residual after each round, and whether the tolerance was reached
+IterationResult = namedtuple("IterationResult", ["ranks", "iterations", "residuals", "converged"])
+
+METHODS = ["jacobi", "gauss-seidel", "extrapolation"]
+
+NORMS = ["inf", "l1"]
+
+
+def power_iteration(graph, damping_factor, tolerance=0.001, initial=None):
+    """
+    Return the PageRank vector of `graph` by power iteration, stopping
+    once no rank changes by more than `tolerance` in a round.
+
+    Iteration starts from the `initial` rank vector if one is given
+    (such as the ranks from before a small edit to the graph), and
+    from equal ranks for every page otherwise.
+    """
+    return iterate_ranks(graph, damping_factor, tolerance=tolerance, initial=initial).ranks
+
+
+def iterate_ranks(graph, damping_factor, method="jacobi", tolerance=0.001, norm="inf",
+                  max_iterations=None, initial=None, blocks=16, period=10):
+    """
+    Iterate towards the PageRank vector of `graph` and return an
+    IterationResult.
+
+    The residual of a round is the change in the (normalised) rank
+    vector, measured in the `norm` "inf" (largest change in any rank)
+    or "l1" (sum of all changes). Iteration stops once the residual is
+    at most `tolerance`, or after `max_iterations` rounds.
+
+    `method` is one of:
+        * "jacobi": power iteration, where every round is one sparse
+          matrix-vector product over the links, plus a rank-1 correction
+          that spreads the rank of pages without links over every page.
+        * "gauss-seidel": pages are updated in `blocks` consecutive
+          blocks, each using the ranks already updated this round.
+        * "extrapolation": power iteration, with quadratic extrapolation
+          (Kamvar et al.) from the last four iterates every `period` rounds.
+
+    All rank buffers are allocated once and updated in place.
+    """
+    if method not in METHODS:
+        raise ValueError(f"unknown method {method!r}")
+    if norm not in NORMS:
+        raise ValueError(f"unknown norm {norm!r}")
+
+    num_pages = graph.num_pages()
+    dangling = graph.out_degree == 0
+    inverse_degree = np.zeros(num_pages)
+    inverse_degree[~dangling] = 1 / graph.out_degree[~dangling]
+    random_choice_prob = (1 - damping_factor) / num_pages
+
+    ranks = np.empty(num_pages)
+    if initial is None:
+        ranks.fill(1 / num_pages)
+    else:
+        np.divide(initial, np.sum(initial), out=ranks)
+    new_ranks = np.empty(num_pages)
+    weighted = np.empty(num_pages)
+    change = np.empty(num_pages)
+
+    if method == "gauss-seidel":
+        # Links sorted by target, so each block's incoming links are contiguous
+        order = np.argsort(graph.indices, kind="stable")
+        in_sources = graph.link_sources()[order]
+        in_targets = graph.indices[order]
+        bounds = np.linspace(0, num_pages, min(blocks, num_pages) + 1).astype(np.int64)
+        link_bounds = np.searchsorted(in_targets, bounds)
+    if method == "extrapolation":
+        history = np.empty((4, num_pages))
+
+    residuals = []
+    while max_iterations is None or len(residuals) < max_iterations:
+        if method == "gauss-seidel":
+            new_ranks[:] = ranks
+            np.multiply(new_ranks, inverse_degree, out=weighted)
+            dangling_rank = new_ranks[dangling].sum()
+            for block in range(len(bounds) - 1):
+                start, end = bounds[block], bounds[block + 1]
+                first, last = link_bounds[block], link_bounds[block + 1]
+                surf_choice_prob = np.bincount(
+                    in_targets[first:last] - start,
+                    weights=weighted[in_sources[first:last]], minlength=end - start)
+
+                # Later blocks see this block's new ranks straight away
+                block_ranks = new_ranks[start:end]
+                old_dangling = block_ranks[dangling[start:end]].sum()
+                np.add(surf_choice_prob, dangling_rank / num_pages, out=block_ranks)
+                block_ranks *= damping_factor
+                block_ranks += random_choice_prob
+                np.multiply(block_ranks, inverse_degree[start:end], out=weighted[start:end])
+                dangling_rank += block_ranks[dangling[start:end]].sum() - old_dangling
+        else:
+            # Rank flowing along links: each page splits its rank over its
+            # links, which are in page order, so repeating each page's share
+            # once per link lines the shares up with `indices`
+            np.multiply(ranks, inverse_degree, out=weighted)
+            surf_choice_prob = np.bincount(graph.indices,
+                                           weights=np.repeat(weighted, graph.out_degree),
+                                           minlength=num_pages)
+
+            # Rank of pages with no links goes to every page equally
+            np.add(surf_choice_prob, ranks[dangling].sum() / num_pages, out=new_ranks)
+
+            new_ranks *= damping_factor
+            new_ranks += random_choice_prob
+        new_ranks /= new_ranks.sum()
+
+        if method == "extrapolation":
+            history[len(residuals) % 4] = new_ranks
+            if len(residuals) >= 3 and (len(residuals) + 1) % period == 0:
+                extrapolate(history, len(residuals), new_ranks)
+
+        np.subtract(new_ranks, ranks, out=change)
+        np.abs(change, out=change)
+        residuals.append(float(change.max() if norm == "inf" else change.sum()))
+        ranks, new_ranks = new_ranks, ranks
+        if residuals[-1] <= tolerance:
+            return IterationResult(ranks, len(residuals), residuals, True)
+
+    return IterationResult(ranks, len(residuals), residuals, False)
+
+
+def extrapolate(history, latest, out):
+    """
+    iterate_ranks helper function
+
+    Overwrite `out` with the quadratic extrapolation of the last four
+    iterates in the ring buffer `history`, where the newest is at
+    position `latest` % 4, unless the extrapolation is unusable.
+    """
+    x0, x1, x2, x3 = (history[(latest - age) % 4] for age in (3, 2, 1, 0))
+    y = np.stack([x1 - x0, x2 - x0], axis=1)
+    gamma, *_ = np.linalg.lstsq(y, -(x3 - x0), rcond=None)
+    beta0 = gamma[0] + gamma[1] + 1
+    beta1 = gamma[1] + 1
+    extrapolated = beta0 * x1 + beta1 * x2 + x3
+    if not np.all(np.isfinite(extrapolated)) or extrapolated.sum() <= 0:
+        return
+    np.maximum(extrapolated, 0, out=out)
+    out /= out.sum()
+
+
+def sample_visits(graph, damping_factor, n, rng=random):
+    """
+    Return the number of times a random surfer visits each page of
+    `graph` in `n` steps, starting from a page chosen at random.
+
+    Each step flips the damping coin and then picks a link of the
+    current page, or any page, uniformly at random, which draws from the
+    same distribution as `transition_model` in constant time per step.
+    """
+    num_pages = graph.num_pages()
+    indptr = graph.indptr.tolist()
+    indices = graph.indices.tolist()
+    degrees = graph.out_degree.tolist()
+    visits = [0] * num_pages
+    uniform = rng.random
+
+    page = int(uniform() * num_pages)
+    visits[page] += 1
+    for _ in range(n - 1):
+        degree = degrees[page]
+        if degree and uniform() < damping_factor:
+            page = indices[indptr[page] + int(uniform() * degree)]
+        else:
+            page = int(uniform() * num_pages)
+        visits[page] += 1
+
+    return np.array(visits)
+
+
+def parallel_sample_visits(graph, damping_factor, n, walkers, workers=None, seed=0):
+    """
+    Split `n` random-surfer steps over `walkers` independent walks, run
+    them on a pool of `workers` processes (default: one per core), and
+    return a (walkers, pages) array of each walk's visit counts.
+
+    Every walk draws from its own generator, seeded from `seed` and its
+    position, so the counts do not depend on the number of workers.
+    """
+    steps = [n // walkers + (1 if walker < n % walkers else 0)
+             for walker in range(walkers)]
+    seeds = [int(child.generate_state(1)[0])
+             for child in np.random.SeedSequence(seed).spawn(walkers)]
+    tasks = [(damping_factor, walker_steps, walker_seed)
+             for walker_steps, walker_seed in zip(steps, seeds)]
+
+    if workers == 1:
+        init_walker(graph)
+        counts = [run_walker(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(workers, initializer=init_walker,
+                                  initargs=(graph,)) as pool:
+            counts = pool.map(run_walker, tasks)
+    return np.array(counts)
+
+
+# LinkGraph walked by run_walker in this process, set by init_walker
+walker_graph = None
+
+
+def init_walker(graph):
+    """
+    parallel_sample_visits helper function
+    """
+    global walker_graph
+    walker_graph = graph
+
+
+def run_walker(task):
+    """
+    parallel_sample_visits helper function
+
+    Returns the visit counts of one seeded walk.
+    """
+    damping_factor, steps, seed = task
+    if steps == 0:
+        return np.zeros(walker_graph.num_pages(), dtype=np.int64)
+    return sample_visits(walker_graph, damping_factor, steps, random.Random(seed))
@@ -0,0 +1,181 @@
+import contextlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from crawler import CHUNK_SIZE, list_pages, parse_files
+from linkgraph import LinkGraph
+
+# Layout version of the store files, checked by read_meta
+VERSION = 1
+
+
+def store_path(directory):
+    """
+    Return the directory holding the compiled link graph of `directory`.
+    """
+    return os.path.join(directory, ".linkgraph")
+
+
+def compile_corpus(directory, workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Compile the HTML pages in `directory` into an on-disk link graph and
+    return it as a LinkGraph memory-mapped from disk.
+
+    The store keeps every file's raw link targets as well as the graph,
+    so when it already exists only files whose size or mtime changed
+    are parsed again. Links from unchanged files are re-checked against
+    the current pages, so links to added or removed pages stay correct.
+    """
+    pages = list_pages(directory)
+    stats = {page: file_stat(os.path.join(directory, page)) for page in pages}
+    previous = load_store(directory)
+
+    # Reuse the raw links of unchanged files, and parse all the others
+    targets = []
+    target_index = {}
+    reused = {}
+    if previous is not None:
+        targets = list(previous["targets"])
+        target_index = {target: i for i, target in enumerate(targets)}
+        old_rows = {page: i for i, page in enumerate(previous["pages"])}
+        for page in pages:
+            row = old_rows.get(page)
+            if row is not None and previous["files"][page] == stats[page]:
+                start, end = previous["raw_indptr"][row], previous["raw_indptr"][row + 1]
+                reused[page] = previous["raw_indices"][start:end]
+
+    changed = [page for page in pages if page not in reused]
+    parsed = {}
+    for page, links in parse_files(directory, changed, workers, chunk_size):
+        for link in links:
+            if link not in target_index:
+                target_index[link] = len(targets)
+                targets.append(link)
+        parsed[page] = np.array(sorted(target_index[link] for link in links),
+                                dtype=np.int32)
+
+    raw_rows = [reused[page] if page in reused else parsed[page] for page in pages]
+    raw_indptr = np.zeros(len(pages) + 1, dtype=np.int64)
+    np.cumsum([len(row) for row in raw_rows], out=raw_indptr[1:])
+    raw_indices = (np.concatenate(raw_rows).astype(np.int32) if raw_rows
+                   else np.zeros(0, dtype=np.int32))
+
+    indptr, indices = filter_links(pages, targets, raw_indptr, raw_indices)
+    save_store(directory, {
+        "pages": pages,
+        "files": stats,
+        "targets": targets,
+        "indptr": indptr,
+        "indices": indices,
+        "raw_indptr": raw_indptr,
+        "raw_indices": raw_indices,
+    })
+    return load_graph(directory)
+
+
+def filter_links(pages, targets, raw_indptr, raw_indices):
+    """
+    Return the CSR (indptr, indices) of links between pages, keeping from
+    each page's raw link targets only other pages in `pages`.
+    """
+    page_index = {page: i for i, page in enumerate(pages)}
+    target_pages = np.array([page_index.get(target, -1) for target in targets],
+                            dtype=np.int64)
+
+    rows = np.repeat(np.arange(len(pages)), np.diff(raw_indptr))
+    links = target_pages[raw_indices] if len(raw_indices) else raw_indices.astype(np.int64)
+    keep = (links >= 0) & (links != rows)
+    rows, links = rows[keep], links[keep]
+
+    order = np.lexsort((links, rows))
+    indptr = np.zeros(len(pages) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(pages)), out=indptr[1:])
+    return indptr, links[order].astype(np.int32)
+
+
+def load_graph(directory):
+    """
+    Return the compiled LinkGraph of `directory`, with its link arrays
+    memory-mapped, or None if it has not been compiled.
+    """
+    store = load_store(directory)
+    if store is None:
+        return None
+    return LinkGraph(store["pages"], store["indptr"], store["indices"])
+
+
+def load_store(directory):
+    path = store_path(directory)
+    meta = read_meta(path, VERSION)
+    if meta is None:
+        return None
+
+    store = {
+        "pages": meta["pages"],
+        "files": {page: tuple(stat) for page, stat in meta["files"].items()},
+    }
+    with open(os.path.join(path, "targets.json")) as f:
+        store["targets"] = json.load(f)
+    for name in ["indptr", "indices", "raw_indptr", "raw_indices"]:
+        store[name] = np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+    return store
+
+
+def save_store(directory, store):
+    meta = {"pages": store["pages"], "files": store["files"]}
+    with staged_directory(store_path(directory), VERSION, meta) as staging:
+        for name in ["indptr", "indices", "raw_indptr", "raw_indices"]:
+            np.save(os.path.join(staging, f"{name}.npy"), store[name])
+        with open(os.path.join(staging, "targets.json"), "w") as f:
+            json.dump(store["targets"], f)
+
+
+@contextlib.contextmanager
+def staged_directory(path, version, meta):
+    """
+    Yield a staging directory beside `path` to write files into. Once
+    they are written, `meta` is stored in its meta.json along with the
+    layout `version`, and the staging directory replaces `path`, so
+    readers never see a partly written directory. If writing fails,
+    the staging directory is removed and `path` is left as it was.
+    """
+    staging = path + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    try:
+        yield staging
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump({"version": version, **meta}, f)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(staging, path)
+
+
+def read_meta(path, version):
+    """
+    Return the meta.json stored by `staged_directory` in `path`, or None
+    if there is none or its files were written with a layout other than
+    `version`, which each module bumps whenever its layout changes.
+    """
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(meta, dict) or meta.get("version") != version:
+        return None
+    return meta
+
+
+def file_stat(filename):
+    """
+    Return (size, mtime) of a file, used to tell whether it changed.
+    """
+    stat = os.stat(filename)
+    return (stat.st_size, stat.st_mtime_ns)
@@ -1,24 +1,125 @@
+import argparse
 import os
 import random
 import re
 import sys
 
+# The NumPy-backed modules (linkgraph, linkstore, edgelist) are imported
+# by the functions that use them, so the original sampler and loop engine
+# run without NumPy installed
+from crawler import crawl_edges, list_pages
+from personalized import EPSILON, forward_push, top_k
+
 DAMPING = 0.85
 SAMPLES = 10000
+WALKERS = 16
 
 
 def main():
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python pagerank.py corpus")
-    corpus = crawl(sys.argv[1])
-    ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
-    print(f"PageRank Results from Sampling (n = {SAMPLES})")
-    for page in sorted(ranks):
-        print(f"  {page}: {ranks[page]:.4f}")
-    ranks = iterate_pagerank(corpus, DAMPING)
-    print(f"PageRank Results from Iteration")
+    parser = argparse.ArgumentParser(usage="python pagerank.py corpus")
+    parser.add_argument("corpus")
+    parser.add_argument("--stream-crawl", action="store_true",
+                        help="parse the pages in chunks, in parallel")
+    parser.add_argument("--compiled", action="store_true",
+                        help="use the compiled link graph of the corpus, "
+                             "re-parsing only pages that changed")
+    parser.add_argument("--engine", choices=["loop", "sparse", "outofcore"], default="loop",
+                        help="iterate over page pairs, with sparse matrix-vector products, "
+                             "or streaming the links from disk")
+    parser.add_argument("--tolerance", type=float, default=0.001,
+                        help="largest residual at convergence (sparse and outofcore engines)")
+    parser.add_argument("--method", choices=["jacobi", "gauss-seidel", "extrapolation"],
+                        default="jacobi",
+                        help="iteration method of the sparse engine")
+    parser.add_argument("--norm", choices=["inf", "l1"], default="inf",
+                        help="measure the residual as the largest change in any rank, "
+                             "or the sum of all changes (sparse and outofcore engines)")
+    parser.add_argument("--max-iterations", type=int,
+                        help="stop after this many rounds (sparse and outofcore engines)")
+    parser.add_argument("--sampler", choices=["model", "fast", "parallel"], default="model",
+                        help="build the transition model every step, sample in "
+                             "constant time, or run many walkers in parallel")
+    parser.add_argument("--samples", type=int, default=SAMPLES)
+    parser.add_argument("--walkers", type=int, default=WALKERS,
+                        help="independent walks for the parallel sampler")
+    parser.add_argument("--workers", type=int,
+                        help="processes for the streaming crawler and parallel sampler "
+                             "(default: one per core)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed for the parallel sampler")
+    parser.add_argument("--personalize", nargs="+", metavar="PAGE",
+                        help="also rank pages for a surfer who teleports to these pages")
+    parser.add_argument("--top", type=int, default=10,
+                        help="number of personalized results to show")
+    args = parser.parse_args()
+
+    if args.engine == "outofcore":
+        # The out-of-core engine parses the corpus straight to disk, so
+        # the links are never loaded to sample from or personalize
+        ignored = [option for option, given in [
+            ("--personalize", args.personalize),
+            ("--sampler", args.sampler != "model"),
+            ("--samples", args.samples != SAMPLES),
+            ("--walkers", args.walkers != WALKERS),
+            ("--compiled", args.compiled),
+            ("--stream-crawl", args.stream_crawl),
+            ("--method", args.method != "jacobi"),
+        ] if given]
+        if ignored:
+            parser.error(f"{', '.join(ignored)} cannot be used with the outofcore engine, "
+                         "which never loads the links into memory; "
+                         "use the loop or sparse engine")
+        corpus = None
+    elif args.compiled:
+        from linkstore import compile_corpus
+        corpus = compile_corpus(args.corpus, args.workers)
+        if args.sampler == "model" or args.engine == "loop":
+            corpus = corpus.to_corpus()
+    elif args.stream_crawl:
+        corpus = stream_crawl(args.corpus, args.workers)
+    else:
+        corpus = crawl(args.corpus)
+    if corpus is not None:
+        intervals = None
+        if args.sampler == "parallel":
+            ranks, intervals = parallel_sample_pagerank(
+                corpus, DAMPING, args.samples, args.walkers, args.workers, args.seed)
+        elif args.sampler == "fast":
+            ranks = fast_sample_pagerank(corpus, DAMPING, args.samples)
+        else:
+            ranks = sample_pagerank(corpus, DAMPING, args.samples)
+        print(f"PageRank Results from Sampling (n = {args.samples})")
+        for page in sorted(ranks):
+            if intervals is None or intervals[page] is None:
+                print(f"  {page}: {ranks[page]:.4f}")
+            else:
+                low, high = intervals[page]
+                print(f"  {page}: {ranks[page]:.4f} (95% CI {low:.4f} to {high:.4f})")
+    if args.engine == "sparse":
+        ranks, result = converge_pagerank(corpus, DAMPING, args.method, args.tolerance,
+                                          args.norm, args.max_iterations)
+        status = "converged" if result.converged else "stopped"
+        print(f"PageRank Results from Iteration ({args.method}, {status} after "
+              f"{result.iterations} rounds, residual {result.residuals[-1]:.2e})")
+    elif args.engine == "outofcore":
+        ranks, result = outofcore_pagerank(args.corpus, DAMPING, args.tolerance, args.norm,
+                                           args.max_iterations, args.workers)
+        status = "converged" if result.converged else "stopped"
+        print(f"PageRank Results from Iteration (out of core, {status} after "
+              f"{result.iterations} rounds, residual {result.residuals[-1]:.2e})")
+    else:
+        ranks = iterate_pagerank(corpus, DAMPING)
+        print(f"PageRank Results from Iteration")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
+    if args.personalize:
+        try:
+            results = top_pages(corpus, args.personalize, DAMPING, args.top)
+        except ValueError as error:
+            sys.exit(str(error))
+        print(f"Top {args.top} Personalized PageRank Results for {', '.join(args.personalize)}")
+        for page, rank in results:
+            print(f"  {page}: {rank:.4f}")
 
 
 def crawl(directory):
@@ -48,6 +149,18 @@ def crawl(directory):
     return pages
 
 
+def stream_crawl(directory, workers=None):
+    """
+    Return the same dictionary as `crawl`, but parse the pages in
+    fixed-size chunks across a pool of `workers` processes (default: one
+    per core), adding each link as soon as its file is parsed.
+    """
+    pages = {filename: set() for filename in list_pages(directory)}
+    for page, link in crawl_edges(directory, workers):
+        pages[page].add(link)
+    return pages
+
+
 def transition_model(corpus, page, damping_factor):
     """
     Return a probability distribution over which page to visit next,
@@ -126,6 +239,51 @@ def sample_pagerank(corpus, damping_factor, n):
     return page_ranks
 
 
+def fast_sample_pagerank(corpus, damping_factor, n):
+    """
+    Return PageRank values for each page by sampling `n` pages like
+    `sample_pagerank`, but with each page's links precomputed as arrays
+    so that each step costs constant time instead of building the full
+    transition model.
+    """
+    from linkgraph import sample_visits
+
+    graph = link_graph(corpus)
+    return graph.ranks_dict(sample_visits(graph, damping_factor, n) / n)
+
+
+def parallel_sample_pagerank(corpus, damping_factor, n, walkers=WALKERS,
+                             workers=None, seed=0):
+    """
+    Return PageRank values for each page by sampling `n` pages over
+    `walkers` independent random surfers, run across `workers` processes
+    with seeded generators, so the same `seed` always gives the same
+    result whatever the number of workers.
+
+    Also return a dictionary mapping each page to a 95% confidence
+    interval (low, high) for its PageRank, from the spread of the
+    walkers' separate estimates (None with fewer than two walkers).
+    """
+    import numpy as np
+    from linkgraph import parallel_sample_visits
+
+    graph = link_graph(corpus)
+    counts = parallel_sample_visits(graph, damping_factor, n, walkers, workers, seed)
+    ranks = counts.sum(axis=0) / n
+
+    intervals = {page: None for page in graph.pages}
+    if walkers >= 2:
+        # Each walker's own estimate, weighted by how many steps it took
+        steps = counts.sum(axis=1)
+        estimates = counts[steps > 0] / steps[steps > 0, None]
+        if len(estimates) >= 2:
+            margin = 1.96 * estimates.std(axis=0, ddof=1) / np.sqrt(len(estimates))
+            intervals = {page: (float(rank - error), float(rank + error))
+                         for page, rank, error in zip(graph.pages, ranks, margin)}
+
+    return graph.ranks_dict(ranks), intervals
+
+
 def iterate_pagerank(corpus, damping_factor):
     """
     Return PageRank values for each page by iteratively updating
@@ -166,9 +324,10 @@ def iterate_pagerank(corpus, damping_factor):
             new_rank = random_choice_prob + (damping_factor * surf_choice_prob)
             new_ranks[page_name] = new_rank
 
-        # Normalise the new page ranks:
+        # Normalise the new page ranks in place:
         norm_factor = sum(new_ranks.values())
-        new_ranks = {page: (rank / norm_factor) for page, rank in new_ranks.items()}
+        for page in new_ranks:
+            new_ranks[page] /= norm_factor
 
         # Find max change in page rank:
         for page_name in corpus:
@@ -176,11 +335,126 @@ def iterate_pagerank(corpus, damping_factor):
             if rank_change > max_rank_change:
                 max_rank_change = rank_change
 
-        # Update page ranks to the new ranks:
-        page_ranks = new_ranks.copy()
+        # Update page ranks to the new ranks, reusing the old dictionary next round:
+        page_ranks, new_ranks = new_ranks, page_ranks
 
     return page_ranks
 
 
+def sparse_pagerank(corpus, damping_factor, tolerance=0.001):
+    """
+    Return the same PageRank values as `iterate_pagerank`, computed by
+    power iteration over a sparse link matrix built once from `corpus`,
+    so that each round costs time proportional to the number of links
+    rather than the square of the number of pages.
+
+    Iteration stops once no rank changes by more than `tolerance`.
+    """
+    from linkgraph import power_iteration
+
+    graph = link_graph(corpus)
+    return graph.ranks_dict(power_iteration(graph, damping_factor, tolerance))
+
+
+def converge_pagerank(corpus, damping_factor, method="jacobi", tolerance=0.001,
+                      norm="inf", max_iterations=None):
+    """
+    Return PageRank values for each page like `sparse_pagerank`, with a
+    choice of iteration `method` ("jacobi", "gauss-seidel" or
+    "extrapolation") and stopping rule: iterate until the residual in
+    `norm` ("inf" or "l1") is at most `tolerance`, or `max_iterations`
+    rounds have run.
+
+    Also return the IterationResult, whose `iterations`, `residuals` and
+    `converged` fields describe how iteration went.
+    """
+    from linkgraph import iterate_ranks
+
+    graph = link_graph(corpus)
+    result = iterate_ranks(graph, damping_factor, method, tolerance, norm, max_iterations)
+    return graph.ranks_dict(result.ranks), result
+
+
+def outofcore_pagerank(directory, damping_factor, tolerance=0.001, norm="inf",
+                       max_iterations=None, workers=None):
+    """
+    Return PageRank values for each page of the corpus in `directory`
+    like `converge_pagerank` with the "jacobi" method, together with the
+    IterationResult, without holding the links in memory.
+
+    The pages are parsed into an edge list on disk, sorted by linked
+    page, which every round then streams through in blocks.
+    """
+    from edgelist import compile_edge_list, stream_ranks
+
+    edges = compile_edge_list(directory, workers)
+    result = stream_ranks(edges, damping_factor, tolerance, norm, max_iterations)
+    return edges.ranks_dict(result.ranks), result
+
+
+def personalized_pagerank(corpus, seeds, damping_factor, epsilon=EPSILON):
+    """
+    Return approximate personalized PageRank values for a surfer who,
+    with probability `1 - damping_factor` (or on a page with no links),
+    jumps to one of the `seeds` pages rather than any page in the corpus.
+
+    Only pages near the seeds get a value, so the dictionary returned
+    leaves out every page whose value is 0. Values are accurate to
+    about `epsilon`; see `forward_push`.
+
+    To answer many queries, pass the corpus as a LinkGraph so it is not
+    rebuilt for each one.
+    """
+    graph = link_graph(corpus)
+    estimates = forward_push(graph, seeds, damping_factor, epsilon)
+    return {graph.pages[page]: estimate for page, estimate in estimates.items()}
+
+
+def top_pages(corpus, seeds, damping_factor, k=10, epsilon=EPSILON):
+    """
+    Return the `k` pages with the highest personalized PageRank for
+    `seeds`, as a list of (page, rank) pairs from highest to lowest.
+    """
+    return top_k(link_graph(corpus), seeds, damping_factor, k, epsilon)
+
+
+def update_pagerank(corpus, ranks, damping_factor, added_pages=(), removed_pages=(),
+                    added_links=(), removed_links=(), tolerance=0.001):
+    """
+    Apply a set of edits to `corpus` and return (corpus, ranks) for the
+    edited corpus, where `ranks` are the previous PageRank values.
+
+    Links are (page, linked page) pairs. Rather than starting again from
+    equal ranks, iteration starts from the previous ranks (with each new
+    page given an average share), so a small edit only needs the few
+    rounds it takes for its effect to spread.
+
+    The edited corpus is returned as the same kind of object as given:
+    a dictionary like `crawl` returns, or a LinkGraph.
+    """
+    import numpy as np
+    from linkgraph import LinkGraph, power_iteration
+
+    graph = link_graph(corpus).with_edits(added_pages, removed_pages,
+                                          added_links, removed_links)
+    initial = np.array([ranks.get(page, 1 / graph.num_pages()) for page in graph.pages])
+    new_ranks = graph.ranks_dict(power_iteration(graph, damping_factor, tolerance, initial))
+
+    if isinstance(corpus, LinkGraph):
+        return graph, new_ranks
+    return graph.to_corpus(), new_ranks
+
+
+def link_graph(corpus):
+    """
+    Return `corpus` as a LinkGraph, building one if it is a dictionary.
+    """
+    from linkgraph import LinkGraph
+
+    if isinstance(corpus, LinkGraph):
+        return corpus
+    return LinkGraph.from_corpus(corpus)
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
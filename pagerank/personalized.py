@@ -0,0 +1,80 @@
+import heapq
+from collections import deque
+
+EPSILON = 1e-5
+
+
+def forward_push(graph, seeds, damping_factor, epsilon=EPSILON):
+    """
+    Return approximate personalized PageRank values for a LinkGraph,
+    where the random surfer teleports to `seeds` instead of any page, as
+    a dictionary mapping page indices to their estimate. Pages left out
+    have an estimate of 0.
+
+    `seeds` is a list of page names, teleported to equally, or a
+    dictionary mapping page names to teleport weights. A page with no
+    links sends the surfer back to the seeds, rather than to every page,
+    so the walk never leaves the seeds' part of the graph.
+
+    Uses the forward push algorithm of Andersen, Chung and Lang: every
+    page holds an estimate and a residual, starting with all the residual
+    on the seeds. Pushing a page moves `1 - damping_factor` of its
+    residual into its estimate and spreads the rest over its links. Pages
+    are pushed until every residual is below `epsilon` times the page's
+    number of links, so only pages near the seeds are ever touched and
+    the cost does not depend on the size of the graph.
+
+    Raises ValueError for a seed that is not a page of the graph.
+    """
+    if not isinstance(seeds, dict):
+        seeds = {page: 1 for page in seeds}
+    total = sum(seeds.values())
+    if not seeds or total <= 0:
+        raise ValueError("no seed pages")
+    try:
+        teleport = {graph.index[page]: weight / total for page, weight in seeds.items()}
+    except KeyError as error:
+        raise ValueError(f"unknown seed page {error}")
+
+    indptr = graph.indptr
+    indices = graph.indices
+    estimates = {}
+    residuals = dict(teleport)
+
+    def threshold(page):
+        # Pages without links still need a positive threshold to stop on
+        return epsilon * max(int(indptr[page + 1] - indptr[page]), 1)
+
+    queue = deque(page for page in residuals if residuals[page] >= threshold(page))
+    queued = set(queue)
+    while queue:
+        page = queue.popleft()
+        queued.discard(page)
+        residual = residuals[page]
+        residuals[page] = 0
+        estimates[page] = estimates.get(page, 0) + (1 - damping_factor) * residual
+
+        links = indices[indptr[page]:indptr[page + 1]].tolist()
+        if links:
+            targets = [(link, damping_factor * residual / len(links)) for link in links]
+        else:
+            targets = [(seed, damping_factor * residual * weight)
+                       for seed, weight in teleport.items()]
+        for target, share in targets:
+            residuals[target] = residuals.get(target, 0) + share
+            if target not in queued and residuals[target] >= threshold(target):
+                queue.append(target)
+                queued.add(target)
+
+    return estimates
+
+
+def top_k(graph, seeds, damping_factor, k, epsilon=EPSILON):
+    """
+    Return the `k` pages with the highest personalized PageRank for
+    `seeds`, as a list of (page name, estimate) pairs from highest to
+    lowest, using `forward_push`.
+    """
+    estimates = forward_push(graph, seeds, damping_factor, epsilon)
+    best = heapq.nlargest(k, estimates.items(), key=lambda item: item[1])
+    return [(graph.pages[page], estimate) for page, estimate in best]